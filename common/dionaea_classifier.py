@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Single-pass classifier for Dionaea text log lines
+
+Shared by log-server/parse_dionaea.py and scripts/parse-dionaea-logs.py.
+Every line is lower-cased once and rejected cheaply unless it mentions ftp
+or a connection. The bracketed timestamp and the component that follows it
+are read with one anchored regex. The remaining fields each have one
+precompiled pattern that only runs when a substring test shows the line
+can contain it: the connection id ("con 0x"), the endpoints ("<->"), the
+first IP address (".") and the FTP verb with its argument.
+
+  [02122025 11:53:15] ftp /dionaea/ftp.py:214-debug: processing line 'b'USER anonymous\\r\\n''
+  [02122025 11:53:15] connection connection.c:4456-message: connection 0x55d6c8 accept/tcp/ftp 172.25.0.2 21 <-> 203.0.113.7 48522
+
+FTP verbs are taken where they occur in the line (leftmost first), so a
+password such as "USER123" is not mistaken for a USER command.
+
+A timestamp that is not a real date or time (e.g. [14092025 ...], read as
+month 14) is replaced with the current time, as the original parsers did,
+rather than passed on as an invalid ISO string.
+"""
+import re
+from datetime import datetime
+
+# [MMDDYYYY HH:MM:SS] or [DDMonYYYY HH:MM:SS], then the component name
+LINE_START = re.compile(
+    r'\[(?:(\d{2})(\d{2})|(\d{2})([A-Za-z]{3}))(\d{4})\s+(\d{2}:\d{2}:\d{2})\]\s+(?:(\w+)\s+)?')
+# Fallbacks for lines that do not start with the timestamp
+TIMESTAMP = re.compile(
+    r'\[(?:(\d{2})(\d{2})|(\d{2})([A-Za-z]{3}))(\d{4})\s+(\d{2}:\d{2}:\d{2})\]')
+COMPONENT = re.compile(r'\]\s+(\w+)\s+')
+
+CONNECTION_ID = re.compile(r'con\s+(0x[0-9a-f]+)')
+IP = r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}'
+FIRST_IP = re.compile(IP)
+# local ip port <-> remote ip port
+ENDPOINTS = re.compile(rf'({IP})[\s:]+(\d+)\s+<->\s+({IP})[\s:]+(\d+)')
+# The lookahead lets the regex engine skip to candidate first letters
+VERB = re.compile(r"""(?=[ULPRSDM])(?:(USER|PASS)\s+([^\r\n'"]+)|(LIST|RETR|STOR|DELE|MKD|RMD))""")
+
+MONTHS = {name: f'{number:02d}' for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+     'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+
+
+class DionaeaLine:
+    """Everything either parser needs from one log line"""
+    __slots__ = ('timestamp', 'component', 'ftp', 'connection', 'state',
+                 'processing', 'connection_id', 'first_ip', 'local', 'remote',
+                 'command', 'argument', 'raw')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.timestamp = None
+        self.component = None
+        self.connection_id = None
+        self.first_ip = None
+        self.local = None
+        self.remote = None
+        self.command = None
+        self.argument = None
+
+
+def format_timestamp(match):
+    """ISO 8601 (naive, as logged) from a LINE_START/TIMESTAMP match"""
+    month, day, day_named, month_name, year, clock = match.group(1, 2, 3, 4, 5, 6)
+    if month is None:
+        day = day_named
+        month = MONTHS.get(month_name.lower())
+        if month is None:
+            return None
+    try:
+        datetime(int(year), int(month), int(day),
+                 int(clock[0:2]), int(clock[3:5]), int(clock[6:8]))
+    except ValueError:
+        return datetime.now().isoformat(timespec='seconds')
+    return f'{year}-{month}-{day}T{clock}'
+
+
+def read_line_start(line):
+    """Return (timestamp, component, offset past the timestamp and component)"""
+    timestamp = component = None
+    start = 0
+    match = LINE_START.match(line)
+    if match:
+        timestamp = format_timestamp(match)
+        component = match.group(7)
+        start = match.end()
+    else:
+        match = TIMESTAMP.search(line)
+        if match:
+            timestamp = format_timestamp(match)
+    if component is None:
+        match = COMPONENT.search(line)
+        if match:
+            component = match.group(1)
+    return timestamp, component, start
+
+
+def classify_line(line):
+    """Classify a line, or return None if it is neither FTP nor connection"""
+    lower = line.lower()
+    ftp = 'ftp' in lower
+    connection = 'connection' in lower
+    if not ftp and not connection:
+        return None
+
+    parsed = DionaeaLine(line)
+    parsed.ftp = ftp
+    parsed.connection = connection
+    if 'accept' in lower:
+        parsed.state = 'accept'
+    elif 'close' in lower or 'disconnect' in lower:
+        parsed.state = 'close'
+    else:
+        parsed.state = None
+    parsed.processing = 'processing line' in line
+
+    parsed.timestamp, parsed.component, start = read_line_start(line)
+
+    if 'con ' in line:
+        match = CONNECTION_ID.search(line, start)
+        if match:
+            parsed.connection_id = match.group(1)
+    if '.' in line:
+        match = FIRST_IP.search(line, start)
+        if match:
+            parsed.first_ip = match.group()
+            if '<->' in line:
+                match = ENDPOINTS.search(line, match.start())
+                if match:
+                    parsed.local = (match.group(1), int(match.group(2)))
+                    parsed.remote = (match.group(3), int(match.group(4)))
+    match = VERB.search(line, start)
+    if match:
+        verb, argument, command = match.groups()
+        parsed.command = verb or command
+        parsed.argument = argument
+    return parsed
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Rotating, compressed NDJSON log segments shared by the honeypots and the
+log server
+
+ssh_honeypot.json stays the live segment that new events are appended to.
+When it grows past LOG_SEGMENT_MB or is older than LOG_SEGMENT_HOURS it is
+renamed to ssh_honeypot.000001.json, a fresh live file is started and the
+closed segment is gzip-compressed in the background to
+ssh_honeypot.000001.json.gz. ssh_honeypot.json.manifest lists the closed
+segments with their record count, keys and min/max timestamps, so readers
+can skip whole segments outside a time range.
+
+Several processes (e.g. gunicorn workers) may append to the same log.
+Writes hold a shared flock on <log>.lock and rotation holds it exclusively,
+so no batch is ever split between two segments. The manifest records the
+inode of the live file it belongs to; a reader that sees a different live
+inode raced a rotation and should read the manifest again.
+
+Under gevent monkey-patching (the web honeypot's gunicorn workers)
+threading.Thread starts greenlets, so a flock wait, a large write or a
+gzip would stall every client of the worker. There the writer runs its
+file work and the compression on gevent's pool of real OS threads, and
+only the calling greenlet waits for them.
+"""
+import os
+import json
+import math
+import gzip
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    from gevent import get_hub, monkey
+except ImportError:
+    monkey = None
+
+SEGMENT_BYTES = int(float(os.environ.get('LOG_SEGMENT_MB', '64')) * 1024 * 1024)
+SEGMENT_SECONDS = float(os.environ.get('LOG_SEGMENT_HOURS', '24')) * 3600
+# Oldest compressed segments beyond this total are deleted (0 keeps all)
+RETAIN_BYTES = int(float(os.environ.get('LOG_RETAIN_MB', '0')) * 1024 * 1024)
+COMPRESS_LEVEL = 6
+BUFFER_SIZE = 1024 * 1024
+# A compression claim older than this was left by a process that died
+STALE_CLAIM = 600
+
+
+def greenlet_threads():
+    """True when gevent has patched threading to start greenlets"""
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def call_blocking(function, *args):
+    """Call function(*args), on one of gevent's OS threads under gevent"""
+    if greenlet_threads():
+        return get_hub().threadpool.apply(function, args)
+    return function(*args)
+
+
+def parse_timestamp(value):
+    """Convert a log or query timestamp to epoch seconds (NaN if unknown)
+
+    Accepts ISO 8601 strings (naive values are treated as UTC) and epoch
+    numbers in seconds or milliseconds.
+    """
+    if isinstance(value, bool) or value is None:
+        return math.nan
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            return math.nan
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    return math.nan
+
+
+# ----------------------------------------------------------------------
+# Manifest
+# ----------------------------------------------------------------------
+
+def manifest_path(path):
+    return path + '.manifest'
+
+
+def segment_name(path, seq):
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f'{stem}.{seq:06d}{ext}'
+
+
+def read_manifest(path):
+    """Return the manifest of a log, or None if it has none yet"""
+    try:
+        with open(manifest_path(path), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(path, manifest):
+    tmp_path = f'{manifest_path(path)}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path(path))
+
+
+def new_manifest(inode):
+    return {'next_seq': 1, 'live_inode': inode, 'live_started': time.time(),
+            'segments': []}
+
+
+@contextmanager
+def locked(path, mode):
+    """Hold a shared (LOCK_SH) or exclusive (LOCK_EX) lock on a log"""
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, mode)
+        yield
+    finally:
+        os.close(fd)
+
+
+def open_segment(path, segment):
+    """Open a closed segment for reading as a binary line iterator
+
+    A segment listed as uncompressed may have been compressed since the
+    manifest was read, so the .gz name is tried as well.
+    """
+    segment_path = os.path.join(os.path.dirname(path), segment['file'])
+    try:
+        if segment_path.endswith('.gz'):
+            return gzip.open(segment_path, 'rb')
+        return open(segment_path, 'rb')
+    except FileNotFoundError:
+        if segment_path.endswith('.gz'):
+            raise
+        return gzip.open(segment_path + '.gz', 'rb')
+
+
+# ----------------------------------------------------------------------
+# Compression and retention of closed segments
+# ----------------------------------------------------------------------
+
+def compress_segment(path, segment):
+    """gzip one closed segment and record its statistics in the manifest"""
+    raw_path = os.path.join(os.path.dirname(path), segment['file'])
+    gz_path = raw_path + '.gz'
+    claim_path = gz_path + '.tmp'
+    if not os.path.exists(raw_path):
+        return
+    try:
+        fd = os.open(claim_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        if time.time() - os.stat(claim_path).st_mtime < STALE_CLAIM:
+            return
+        fd = os.open(claim_path, os.O_WRONLY | os.O_TRUNC)
+
+    records = 0
+    keys = {}
+    min_ts = max_ts = None
+    try:
+        with os.fdopen(fd, 'wb') as out, \
+                gzip.GzipFile(fileobj=out, mode='wb', compresslevel=COMPRESS_LEVEL) as gz, \
+                open(raw_path, 'rb') as src:
+            for line in src:
+                gz.write(line)
+                try:
+                    log_entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(log_entry, dict):
+                    continue
+                records += 1
+                for key in log_entry:
+                    keys.setdefault(key)
+                ts = parse_timestamp(log_entry.get('timestamp'))
+                if not math.isnan(ts):
+                    min_ts = ts if min_ts is None else min(min_ts, ts)
+                    max_ts = ts if max_ts is None else max(max_ts, ts)
+    except OSError:
+        os.remove(claim_path)
+        raise
+
+    with locked(path, fcntl.LOCK_EX):
+        manifest = read_manifest(path)
+        entry = next((entry for entry in manifest['segments']
+                      if entry['seq'] == segment['seq']), None)
+        if entry is None or entry['compressed']:
+            # Another process finished this segment first
+            os.remove(claim_path)
+            return
+        os.replace(claim_path, gz_path)
+        entry.update(file=os.path.basename(gz_path), compressed=True,
+                     records=records, keys=list(keys),
+                     min_ts=min_ts, max_ts=max_ts)
+        write_manifest(path, manifest)
+        os.remove(raw_path)
+
+
+def apply_retention(path, retain_bytes):
+    """Delete the oldest compressed segments beyond retain_bytes in total"""
+    directory = os.path.dirname(path)
+    with locked(path, fcntl.LOCK_EX):
+        manifest = read_manifest(path)
+        total = 0
+        keep = []
+        for segment in reversed(manifest['segments']):
+            try:
+                total += os.path.getsize(os.path.join(directory, segment['file']))
+            except OSError:
+                pass
+            if segment['compressed'] and total > retain_bytes:
+                try:
+                    os.remove(os.path.join(directory, segment['file']))
+                except OSError:
+                    pass
+                continue
+            keep.append(segment)
+        if len(keep) != len(manifest['segments']):
+            manifest['segments'] = keep[::-1]
+            write_manifest(path, manifest)
+
+
+def replace_log(path, new_path):
+    """Atomically make new_path the whole content of a segmented log
+
+    The live file is replaced with a rename and the closed segments are
+    dropped, so readers see either the old or the new log, never a
+    truncated one. Writers notice the new inode on their next flush.
+    """
+    directory = os.path.dirname(path)
+    with locked(path, fcntl.LOCK_EX):
+        old = read_manifest(path)
+        os.replace(new_path, path)
+        write_manifest(path, new_manifest(os.stat(path).st_ino))
+        for segment in old['segments'] if old else ():
+            for name in (segment['file'], segment['file'] + '.gz'):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+def compress_pending(path, retain_bytes=RETAIN_BYTES):
+    """Compress closed segments until none are left, including any closed
+    by other processes in the meantime"""
+    attempted = set()
+    while True:
+        manifest = read_manifest(path) or {'segments': []}
+        pending = [segment for segment in manifest['segments'] if
+                   not segment['compressed'] and segment['seq'] not in attempted]
+        if not pending:
+            break
+        for segment in pending:
+            attempted.add(segment['seq'])
+            compress_segment(path, segment)
+    if retain_bytes:
+        apply_retention(path, retain_bytes)
+
+
+# ----------------------------------------------------------------------
+# Writer
+# ----------------------------------------------------------------------
+
+class SegmentedLog:
+    """Buffered append-only writer for one segmented NDJSON log
+
+    write() buffers whole lines; flush() appends them to the live segment
+    with a single O_APPEND write and rotates the segment when it is full.
+    """
+
+    def __init__(self, path, max_bytes=SEGMENT_BYTES, max_age=SEGMENT_SECONDS,
+                 retain_bytes=RETAIN_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retain_bytes = retain_bytes
+        self.buffer = bytearray()
+        self.fd = None
+        self.inode = None
+        self.started = None
+        self.compressor = None
+        self.threadpool = get_hub().threadpool if greenlet_threads() else None
+        self._blocking(self._open_live)
+        # Finish segments a previous run closed but did not compress
+        self._compress_in_background()
+
+    def _blocking(self, function, *args):
+        """Call function off the gevent hub when running under gevent"""
+        if self.threadpool is None:
+            return function(*args)
+        return self.threadpool.apply(function, args)
+
+    def _open_live(self):
+        with locked(self.path, fcntl.LOCK_EX):
+            self._open()
+            manifest = read_manifest(self.path)
+            if manifest is None:
+                manifest = new_manifest(self.inode)
+                write_manifest(self.path, manifest)
+            elif manifest['live_inode'] != self.inode:
+                manifest['live_inode'] = self.inode
+                write_manifest(self.path, manifest)
+            self.started = manifest['live_started']
+
+    def _open(self):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.inode = os.fstat(self.fd).st_ino
+        self.started = None
+
+    def fileno(self):
+        return self.fd
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.buffer += data
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        if self._blocking(self._append, data):
+            self._compress_in_background()
+
+    def _append(self, data):
+        """Write data to the live segment; True if that closed a segment"""
+        with locked(self.path, fcntl.LOCK_SH):
+            try:
+                current = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != self.inode:
+                # Another process rotated the live segment
+                self._open()
+            while data:
+                data = data[os.write(self.fd, data):]
+            size = os.fstat(self.fd).st_size
+        if size >= self.max_bytes or self._age() >= self.max_age:
+            return self._rotate()
+        return False
+
+    def _age(self):
+        if self.started is None:
+            manifest = read_manifest(self.path)
+            self.started = manifest['live_started'] if manifest else time.time()
+        return time.time() - self.started
+
+    def rotate(self):
+        """Close the live segment and start a new one"""
+        if self._blocking(self._rotate):
+            self._compress_in_background()
+
+    def _rotate(self):
+        with locked(self.path, fcntl.LOCK_EX):
+            manifest = read_manifest(self.path) or new_manifest(self.inode)
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            if st.st_ino != self.inode:
+                self._open()
+            self.started = manifest['live_started']
+            # Another writer may have rotated while we waited for the lock
+            if st.st_size < self.max_bytes and self._age() < self.max_age:
+                return False
+            now = time.time()
+            if st.st_size:
+                seq = manifest['next_seq']
+                closed_path = os.path.join(os.path.dirname(self.path),
+                                           segment_name(self.path, seq))
+                os.rename(self.path, closed_path)
+                self._open()
+                manifest['segments'].append({
+                    'seq': seq,
+                    'file': os.path.basename(closed_path),
+                    'compressed': False,
+                    'bytes': st.st_size,
+                    'closed_at': now,
+                })
+                manifest['next_seq'] = seq + 1
+            manifest['live_inode'] = self.inode
+            manifest['live_started'] = self.started = now
+            write_manifest(self.path, manifest)
+        return True
+
+    def _compressing(self):
+        if self.compressor is None:
+            return False
+        if self.threadpool is None:
+            return self.compressor.is_alive()
+        return not self.compressor.ready()
+
+    def _compress_in_background(self):
+        if self._compressing():
+            return
+        if self.threadpool is None:
+            self.compressor = threading.Thread(
+                target=compress_pending, args=(self.path, self.retain_bytes), daemon=True)
+            self.compressor.start()
+        else:
+            self.compressor = self.threadpool.spawn(
+                compress_pending, self.path, self.retain_bytes)
+
+    def close(self):
+        self.flush()
+        if self.compressor is not None:
+            if self.threadpool is None:
+                self.compressor.join(timeout=30)
+            else:
+                self.compressor.wait(timeout=30)
+        os.close(self.fd)
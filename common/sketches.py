@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Mergeable summaries for distinct counts and frequent values
+
+HyperLogLog estimates how many distinct values were added with a
+relative standard error of 1.04 / sqrt(2 ** precision), in at most
+2 ** precision bytes. Registers are kept sparse (only the ones set) until
+that would take more memory than the dense array.
+
+HeavyHitters counts values exactly until it sees more than max_keys
+distinct ones, then keeps a Misra-Gries summary: counts are lower bounds,
+low by at most error, and any value missing from it occurred at most error
+times. error stays below total / (max_keys + 1).
+
+Both merge losslessly with another summary of the same size, so per-file
+or per-time-bucket summaries can be combined into one.
+"""
+import base64
+import math
+from collections import Counter
+from hashlib import blake2b
+
+HASH_CACHE_SIZE = 65536
+_hash_cache = {}
+
+
+def hash64(value):
+    """Stable 64-bit hash of a string (the same in every process)"""
+    h = _hash_cache.get(value)
+    if h is None:
+        if len(_hash_cache) >= HASH_CACHE_SIZE:
+            _hash_cache.clear()
+        h = _hash_cache[value] = int.from_bytes(
+            blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+    return h
+
+
+def hll_precision(error):
+    """Smallest precision whose relative standard error is at most error"""
+    return min(16, max(4, math.ceil(math.log2((1.04 / error) ** 2))))
+
+
+def top_capacity(error):
+    """HeavyHitters size whose counts are low by at most error * total"""
+    return max(1, math.ceil(1 / error) - 1)
+
+
+def _sigma(x):
+    if x == 1:
+        return math.inf
+    y = 1
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    if x == 0 or x == 1:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """Distinct-count estimate of the values added"""
+    __slots__ = ('precision', 'sparse', 'registers')
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.sparse = {}
+        self.registers = None
+
+    def add(self, value):
+        self.add_hash(hash64(value))
+
+    def add_hash(self, h):
+        p = self.precision
+        index = h >> (64 - p)
+        rank = (64 - p) - (h & ((1 << (64 - p)) - 1)).bit_length() + 1
+        registers = self.registers
+        if registers is not None:
+            if rank > registers[index]:
+                registers[index] = rank
+        elif rank > self.sparse.get(index, 0):
+            self.sparse[index] = rank
+            # A dict entry costs far more than the one byte of a register
+            if len(self.sparse) > (1 << p) // 32:
+                self._densify()
+
+    def _densify(self):
+        registers = bytearray(1 << self.precision)
+        for index, rank in self.sparse.items():
+            registers[index] = rank
+        self.registers = registers
+        self.sparse = {}
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        if other.registers is None:
+            for index, rank in other.sparse.items():
+                if self.registers is not None:
+                    if rank > self.registers[index]:
+                        self.registers[index] = rank
+                elif rank > self.sparse.get(index, 0):
+                    self.sparse[index] = rank
+            if self.registers is None and len(self.sparse) > (1 << self.precision) // 32:
+                self._densify()
+            return
+        if self.registers is None:
+            self._densify()
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """Estimate with Ertl's improved estimator, which needs no
+        small-range correction or bias tables"""
+        m = 1 << self.precision
+        q = 64 - self.precision
+        if self.registers is None:
+            histogram = Counter(self.sparse.values())
+            histogram[0] = m - len(self.sparse)
+        else:
+            histogram = Counter(self.registers)
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + histogram[rank])
+        z += m * _sigma(histogram[0] / m)
+        if z == math.inf:
+            return 0.0
+        return m * m / (2 * math.log(2) * z)
+
+    def error(self):
+        """Relative standard error of count()"""
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def to_state(self):
+        if self.registers is not None:
+            return 'd' + base64.b64encode(self.registers).decode()
+        packed = bytearray()
+        for index, rank in sorted(self.sparse.items()):
+            packed += index.to_bytes(2, 'big') + bytes((rank,))
+        return 's' + base64.b64encode(packed).decode()
+
+    @classmethod
+    def from_state(cls, precision, state):
+        hll = cls(precision)
+        data = base64.b64decode(state[1:])
+        if state[0] == 'd':
+            hll.registers = bytearray(data)
+        else:
+            hll.sparse = {int.from_bytes(data[i:i + 2], 'big'): data[i + 2]
+                          for i in range(0, len(data), 3)}
+        return hll
+
+
+class HeavyHitters:
+    """Value counts, exact up to max_keys distinct values
+
+    Past 2 * max_keys values the counts are reduced Misra-Gries style: the
+    (max_keys + 1)-th largest count is subtracted from every value and
+    values left at zero are dropped. error is the sum of what was
+    subtracted, the most any count can be low by.
+    """
+    __slots__ = ('max_keys', 'counts', 'error')
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.counts = {}
+        self.error = 0
+
+    def add(self, value):
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + 1
+        if len(counts) > 2 * self.max_keys:
+            self.reduce()
+
+    def reduce(self):
+        if len(self.counts) <= self.max_keys:
+            return
+        cut = sorted(self.counts.values(), reverse=True)[self.max_keys]
+        self.error += cut
+        self.counts = {value: count - cut for value, count in self.counts.items()
+                       if count > cut}
+
+    def merge(self, other):
+        counts = self.counts
+        for value, count in other.counts.items():
+            counts[value] = counts.get(value, 0) + count
+        self.error += other.error
+        if len(counts) > 2 * self.max_keys:
+            self.reduce()
+
+    def top(self, n):
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+    def to_state(self):
+        return [self.counts, self.error]
+
+    @classmethod
+    def from_state(cls, max_keys, state):
+        hitters = cls(max_keys)
+        hitters.counts, hitters.error = state
+        return hitters
@@ -1,10 +1,46 @@
 #!/usr/bin/env python3
 import json
+import sys
+
+# --stats points the timeseries, gauge and piechart panels at the log
+# server's pre-aggregated /stats endpoints instead of raw events
+USE_STATS = '--stats' in sys.argv
 
 # Load working dashboard as template
 with open('dashboards/honeypot-attacks.json', 'r') as f:
     template = json.load(f)
 
+def scope_to_dashboard(panels):
+    """Let the log server filter by the dashboard time range and columns"""
+    for panel in panels:
+        target = panel['targets'][0]
+        fields = [field['jsonPath'].split('.', 1)[1] for field in target['fields']]
+        target['queryParams'] = 'from=${__from}&to=${__to}&fields=' + ','.join(fields)
+
+def point_at_stats(panel, metric, fields, params=''):
+    """Serve a panel from /stats/<log> so it receives counts, not events"""
+    target = panel['targets'][0]
+    target['urlPath'] = '/stats' + target['urlPath']
+    target['fields'] = fields
+    target['queryParams'] = f'metric={metric}{params}&from=${{__from}}&to=${{__to}}'
+
+def use_stats_endpoints(timeline, gauge, pie, pie_metric, pie_params=''):
+    point_at_stats(timeline, 'timeseries', [
+        {"jsonPath": "$[*].time", "name": "Time", "type": "time"},
+        {"jsonPath": "$[*].count", "language": "jsonpath", "name": "Count", "type": "number"}
+    ], '&interval=300')
+    point_at_stats(gauge, 'total', [
+        {"jsonPath": "$.count", "language": "jsonpath", "name": "Count", "type": "number"}
+    ])
+    if pie_metric == 'event_types':
+        pie_field, pie_name = 'event_type', 'Event Type'
+    else:
+        pie_field, pie_name = pie_params.split('=')[-1], pie['targets'][0]['fields'][0]['name']
+    point_at_stats(pie, pie_metric, [
+        {"jsonPath": f"$[*].{pie_field}", "name": pie_name},
+        {"jsonPath": "$[*].count", "language": "jsonpath", "name": "Count", "type": "number"}
+    ], pie_params)
+
 # ============================================
 # SSH Dashboard - Minimal (2 graphs, 2 tables)
 # ============================================
@@ -62,6 +98,9 @@ ssh_table['targets'][0]['datasource']['uid'] = 'ssh-logs'
 ssh_table['targets'][0]['urlPath'] = '/ssh-honeypot/ssh_honeypot.json'
 
 ssh_dashboard['panels'] = [ssh_timeline, ssh_gauge, ssh_pie, ssh_table]
+scope_to_dashboard(ssh_dashboard['panels'])
+if USE_STATS:
+    use_stats_endpoints(ssh_timeline, ssh_gauge, ssh_pie, 'event_types')
 
 with open('dashboards/ssh-attacks.json', 'w') as f:
     json.dump(ssh_dashboard, f, indent=2)
@@ -120,6 +159,9 @@ web_table['gridPos'] = {"h": 8, "w": 12, "x": 12, "y": 8}
 # Already uses web-logs datasource
 
 web_dashboard['panels'] = [web_timeline, web_gauge, web_pie, web_table]
+scope_to_dashboard(web_dashboard['panels'])
+if USE_STATS:
+    use_stats_endpoints(web_timeline, web_gauge, web_pie, 'top', '&field=method')
 
 with open('dashboards/web-attacks.json', 'w') as f:
     json.dump(web_dashboard, f, indent=2)
@@ -182,6 +224,9 @@ ftp_table['targets'][0]['datasource']['uid'] = 'ftp-logs'
 ftp_table['targets'][0]['urlPath'] = '/dionaea/ftp_parsed.json'
 
 ftp_dashboard['panels'] = [ftp_timeline, ftp_gauge, ftp_pie, ftp_table]
+scope_to_dashboard(ftp_dashboard['panels'])
+if USE_STATS:
+    use_stats_endpoints(ftp_timeline, ftp_gauge, ftp_pie, 'event_types')
 
 with open('dashboards/ftp-attacks.json', 'w') as f:
     json.dump(ftp_dashboard, f, indent=2)
@@ -189,4 +234,6 @@ print("✓ Created minimal FTP dashboard (2 graphs, 2 tables)")
 
 print("\n✓ All minimal dashboards created!")
 print("✓ Each dashboard has: 1 timeseries graph, 1 gauge, 1 piechart, 1 table")
+if not USE_STATS:
+    print("✓ Run with --stats to serve graphs and gauges from /stats rollups")
 print("\nRestart Grafana: docker restart honeypot-grafana")
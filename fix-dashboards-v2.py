@@ -3,6 +3,10 @@ import json
 import sys
 from collections import OrderedDict
 
+# --stats points the "Unique ..." stat panels at the log server's distinct
+# count sketches, so Grafana gets one number instead of every value
+USE_STATS = '--stats' in sys.argv
+
 def create_target(datasource_uid, url_path, fields):
     """Create a target with the exact field order from working dashboard"""
     return {
@@ -18,6 +22,17 @@ def create_target(datasource_uid, url_path, fields):
         "urlPath": url_path
     }
 
+def use_cardinality(panel, datasource_uid, url_path, field):
+    """Serve a stat panel from /stats/<log>?metric=cardinality"""
+    target = create_target(datasource_uid, "/stats" + url_path, [
+        {"jsonPath": "$.count", "language": "jsonpath", "name": "Count", "type": "number"}
+    ])
+    target['queryParams'] = f'metric=cardinality&field={field}&from=${{__from}}&to=${{__to}}'
+    panel['targets'][0] = target
+    reduce_options = panel.get('options', {}).get('reduceOptions')
+    if reduce_options is not None:
+        reduce_options['calcs'] = ['lastNotNull']
+
 def fix_ssh_dashboard():
     with open('dashboards/ssh-attacks.json', 'r') as f:
         dashboard = json.load(f)
@@ -46,6 +61,11 @@ def fix_ssh_dashboard():
         {"jsonPath": "$[*].timestamp", "name": "Time", "type": "time"},
         {"jsonPath": "$[*].password", "name": "Password"}
     ])
+
+    if USE_STATS:
+        for index, field in ((1, 'src_ip'), (2, 'username'), (3, 'password')):
+            use_cardinality(dashboard['panels'][index], "ssh-logs",
+                            "/ssh-honeypot/ssh_honeypot.json", field)
     
     # Panel 4: Recent Login Attempts (table)
     dashboard['panels'][4]['targets'][0] = create_target("ssh-logs", "/ssh-honeypot/ssh_honeypot.json", [
@@ -111,6 +131,11 @@ def fix_web_dashboard():
         {"jsonPath": "$[*].timestamp", "name": "Time", "type": "time"},
         {"jsonPath": "$[*].user_agent", "name": "User Agent"}
     ])
+
+    if USE_STATS:
+        for index, field in ((1, 'src_ip'), (2, 'path')):
+            use_cardinality(dashboard['panels'][index], "web-logs",
+                            "/web-honeypot/honeypot.json", field)
     
     # Panel 4: Recent HTTP Requests (table)
     dashboard['panels'][4]['targets'][0] = create_target("web-logs", "/web-honeypot/honeypot.json", [
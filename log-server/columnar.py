@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Column-oriented output formats for the log server
+
+format=columns returns
+  {"length": n, "columns": {"timestamp": [...], "event_type":
+      {"dictionary": ["connection", ...], "indices": [0, 1, 0, null, ...]}}}
+so keys are written once instead of once per record, and repetitive string
+columns are dictionary-encoded. format=arrow returns the same table as an
+Arrow IPC stream when the optional pyarrow package is installed.
+"""
+import json
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def collect_columns(records):
+    """Transpose normalized records (which all share the same keys)"""
+    columns = None
+    length = 0
+    for log_entry in records:
+        if columns is None:
+            columns = {key: [] for key in log_entry}
+        for key, column in columns.items():
+            column.append(log_entry.get(key))
+        length += 1
+    return length, columns or {}
+
+
+def should_encode(column):
+    """Dictionary-encode string columns with many repeated values"""
+    distinct = set()
+    for value in column:
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            return False
+        distinct.add(value)
+    return bool(distinct) and len(distinct) * 2 <= len(column)
+
+
+def dictionary_encode(column):
+    positions = {}
+    dictionary = []
+    indices = []
+    for value in column:
+        if value is None:
+            indices.append(None)
+            continue
+        position = positions.get(value)
+        if position is None:
+            position = positions[value] = len(dictionary)
+            dictionary.append(value)
+        indices.append(position)
+    return {'dictionary': dictionary, 'indices': indices}
+
+
+def to_column_json(records):
+    length, columns = collect_columns(records)
+    encoded = {key: dictionary_encode(column) if should_encode(column) else column
+               for key, column in columns.items()}
+    return json.dumps({'length': length, 'columns': encoded}).encode()
+
+
+def to_arrow_ipc(records):
+    """Serialize records as an Arrow IPC stream (requires pyarrow)"""
+    _, columns = collect_columns(records)
+    arrays = {}
+    for key, column in columns.items():
+        # Nested values (headers, form data...) are kept as JSON text
+        if any(isinstance(value, (dict, list)) for value in column):
+            column = [None if value is None else json.dumps(value)
+                      for value in column]
+        try:
+            array = pyarrow.array(column)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            array = pyarrow.array([None if value is None else str(value)
+                                   for value in column])
+        if pyarrow.types.is_string(array.type) and should_encode(column):
+            array = array.dictionary_encode()
+        arrays[key] = array
+    table = pyarrow.table(arrays) if arrays else pyarrow.table({})
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Content-Encoding negotiation and streaming compressors for the log server
+
+gzip is always available; zstd and brotli are used when the optional
+zstandard / brotli packages are installed.
+"""
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+ZSTD_LEVEL = int(os.environ.get('ZSTD_LEVEL', '3'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+# Server preference when the client accepts several encodings equally
+PREFERENCE = [name for name, available in (
+    ('zstd', zstandard is not None),
+    ('br', brotli is not None),
+    ('gzip', True),
+) if available]
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best supported encoding for an Accept-Encoding header
+
+    Returns 'identity' when the client accepts none of ours.
+    """
+    if not accept_encoding:
+        return 'identity'
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = 'identity', 0.0
+    for name in PREFERENCE:
+        q = weights.get(name, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class Compressor:
+    """Incremental compressor with a common compress()/flush() interface"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._compress, self._flush = obj.compress, obj.flush
+        elif encoding == 'zstd':
+            obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._compress, self._flush = obj.compress, obj.flush
+        elif encoding == 'br':
+            obj = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress, self._flush = obj.process, obj.finish
+        else:
+            self._compress, self._flush = bytes, bytes
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def flush(self):
+        return self._flush()
+
+
+def compress(data, encoding):
+    """One-shot compression of a complete body"""
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
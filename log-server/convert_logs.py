@@ -2,89 +2,616 @@
 """
 Simple HTTP server that converts NDJSON log files to JSON arrays
 Also parses Dionaea text logs on-demand
+
+Responses are streamed record-by-record with chunked transfer encoding.
+Parsed records and the union of keys used to pad them are kept in a
+persistent per-file index (see log_index.py), so only lines appended since
+the last request are parsed. Closed segments of rotated logs (see
+segments.py) are read as well, skipping those outside the requested range.
+
+Query parameters (all optional):
+  from, to        time range as epoch s/ms, ISO 8601 or now-6h style
+  fields          comma-separated columns to return (count/id included)
+  event_type      comma-separated event types to keep
+  src_ip          comma-separated source IPs to keep
+  limit, offset   paging applied after filtering
+  format          rows (default), columns (column JSON with dictionary-
+                  encoded strings) or arrow (Arrow IPC stream, needs pyarrow)
+
+/events answers from the SQLite store's normalized events of every log
+(see event_schema.py), oldest first, and also accepts protocol=ssh,http,ftp
+and action=connect,disconnect,login,command,request,other filters.
+/attackers/<ip> returns that IP's sessions across all honeypots (events at
+most SESSION_GAP apart, see sessions.py), each with its events in order:
+  {"src_ip": ..., "events": n, "sessions": [{"start_ts": ..., "end_ts": ...,
+   "protocols": [...], "logins": n, "commands": n, "timeline": [...]}]}
+from, to and fields apply to the events.
+
+/stats/<log path> answers from pre-aggregated rollups (see rollups.py):
+  metric=total                      {"count": n}
+  metric=timeseries&interval=300    [{"time": ..., "count": n}, ...]
+  metric=event_types                [{"event_type": ..., "count": n}, ...]
+  metric=top&field=src_ip&n=10      [{"src_ip": ..., "count": n}, ...]
+  metric=distinct&field=src_ip      {"count": n}
+  metric=cardinality&field=src_ip   {"count": n, "error": e, "lower": n, "upper": n}
+  metric=heavy_hitters&field=src_ip&n=10
+                                    [{"src_ip": ..., "count": n, "error": n}, ...]
+from/to apply at one-minute granularity; top/distinct over a time range
+scan only the indexed records inside that range. cardinality and
+heavy_hitters (src_ip, username, password or path) merge per-hour and
+per-day sketches instead, so any range costs the same: from/to apply at
+one-hour granularity, error is the relative standard error of count
+(lower/upper span two of them) and each heavy hitter count is low by at
+most its error.
+
+With STORE_BACKEND=sqlite the logs in EVENT_SOURCES are tailed into an
+SQLite database (see event_store.py) and answered with indexed queries;
+other logs, and sources not ingested yet, are still served from files.
 """
 import os
+import re
 import json
+import math
+import shutil
+import time
+import itertools
 import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qs
+
+from columnar import ARROW_CONTENT_TYPE, pyarrow, to_arrow_ipc, to_column_json
+from compression import Compressor, choose_encoding, compress
+from event_store import EVENT_SOURCES, get_store
+from log_index import STATE_DIR, get_index, parse_timestamp
+from rollups import (SKETCH_FIELDS, TOP_FIELDS, Rollup, merged_distinct,
+                     merged_top)
+from response_cache import (MAX_ENTRY_SIZE, ResponseCache, etag_matches,
+                            make_etag)
+from segments import get_segments, live_id_base, manifest_identity, union_keys
+
+STREAMING = os.environ.get('STREAMING', '1') != '0'
+# files: index and scan the NDJSON logs; sqlite: answer EVENT_SOURCES from
+# the SQLite event store (see event_store.py) once it has ingested them
+STORE_BACKEND = os.environ.get('STORE_BACKEND', 'files')
+WORKERS = int(os.environ.get('LOG_SERVER_WORKERS', '16'))
+
+# Compressed bodies of files untouched for IMMUTABLE_AFTER seconds (e.g.
+# rotated segments) are also kept on disk so they are only compressed once.
+# Only requests without from/to qualify: dashboards move the range on every
+# refresh, so a ranged body would be written once and never read again.
+PRECOMPRESS_IMMUTABLE = os.environ.get('PRECOMPRESS_IMMUTABLE', '1') != '0'
+IMMUTABLE_AFTER = int(os.environ.get('IMMUTABLE_AFTER', '3600'))
+PRECOMPRESSED_DIR = os.path.join(STATE_DIR, 'precompressed')
+PRECOMPRESSED_BUDGET = int(os.environ.get('PRECOMPRESSED_MB', '512')) * 1024 * 1024
+TMP_SUFFIX = '.tmp'
+STALE_TMP_SECONDS = 3600
+CHUNK_SIZE = 64 * 1024
+
+RELATIVE_TIME = re.compile(r'^now(?:-(\d+)([smhdw]))?$')
+TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+RESPONSE_CACHE = ResponseCache()
+
+FORMATS = ('rows', 'columns', 'arrow')
+
+STATS_PREFIX = 'stats/'
+EVENTS_PATH = 'events'
+ATTACKERS_PREFIX = 'attackers/'
+STATS_METRICS = ('total', 'timeseries', 'event_types', 'top', 'distinct',
+                 'cardinality', 'heavy_hitters')
+SKETCH_METRICS = ('cardinality', 'heavy_hitters')
+
+
+def parse_time_param(value):
+    """Parse a from/to value: epoch s/ms, ISO 8601 or now[-<n><s|m|h|d|w>]"""
+    match = RELATIVE_TIME.match(value)
+    if match:
+        ts = time.time()
+        if match.group(1):
+            ts -= int(match.group(1)) * TIME_UNITS[match.group(2)]
+        return ts
+    try:
+        ts = parse_timestamp(float(value))
+    except ValueError:
+        ts = parse_timestamp(value)
+    if math.isnan(ts):
+        raise ValueError(f"Invalid time value: {value}")
+    return ts
+
+
+def parse_query(query_string):
+    """Parse the supported query parameters, raising ValueError if invalid"""
+    params = {key: values[-1] for key, values in parse_qs(query_string).items()}
+
+    def csv(name):
+        if not params.get(name):
+            return None
+        return [item.strip() for item in params[name].split(',') if item.strip()]
+
+    def non_negative_int(name):
+        if name not in params:
+            return None
+        value = int(params[name])
+        if value < 0:
+            raise ValueError(f"{name} must not be negative")
+        return value
+
+    event_types = csv('event_type')
+    src_ips = csv('src_ip')
+    protocols = csv('protocol')
+    actions = csv('action')
+    output_format = params.get('format', 'rows')
+    if output_format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if output_format == 'arrow' and pyarrow is None:
+        raise ValueError("format=arrow requires pyarrow to be installed")
+    return {
+        'from': parse_time_param(params['from']) if params.get('from') else None,
+        'to': parse_time_param(params['to']) if params.get('to') else None,
+        'fields': csv('fields'),
+        'event_type': set(event_types) if event_types else None,
+        'src_ip': set(src_ips) if src_ips else None,
+        'protocol': set(protocols) if protocols else None,
+        'action': set(actions) if actions else None,
+        'limit': non_negative_int('limit'),
+        'offset': non_negative_int('offset') or 0,
+        'format': output_format,
+    }
+
+
+def iter_records(index, snapshot, segments, manifest, query):
+    """Yield normalized records one at a time, oldest segment first
+
+    Closed segments outside the time range are skipped and the live file's
+    range is resolved by its index; event_type and src_ip (which also
+    matches the web honeypot's remote_addr) are exact-match filters.
+    """
+    keys = union_keys(manifest, snapshot)
+    live_keys = snapshot['keys']
+    base = live_id_base(manifest)
+    live = ((base + line_no, dict(zip(live_keys, values)))
+            for line_no, values in index.iter_rows(snapshot, query['from'], query['to']))
+    fields = query['fields']
+    event_types = query['event_type']
+    src_ips = query['src_ip']
+    to_skip = query['offset']
+    remaining = query['limit']
+    if remaining == 0:
+        return
+
+    for record_id, log_entry in itertools.chain(
+            segments.iter_entries(manifest, query['from'], query['to']), live):
+        if event_types is not None and log_entry.get('event_type') not in event_types:
+            continue
+        if src_ips is not None and (log_entry.get('src_ip')
+                                    or log_entry.get('remote_addr')) not in src_ips:
+            continue
+        if to_skip:
+            to_skip -= 1
+            continue
+
+        # Add missing keys with None values
+        if len(log_entry) < len(keys):
+            for key in keys:
+                if key not in log_entry:
+                    log_entry[key] = None
+
+        # Add visualization fields
+        log_entry['count'] = 1
+        log_entry['id'] = record_id
+
+        if fields:
+            log_entry = {field: log_entry.get(field) for field in fields}
+        yield log_entry
+
+        if remaining is not None:
+            remaining -= 1
+            if remaining == 0:
+                return
+
+
+def parse_stats_query(query_string):
+    """Parse the /stats parameters, raising ValueError if invalid"""
+    params = {key: values[-1] for key, values in parse_qs(query_string).items()}
+    metric = params.get('metric', 'total')
+    if metric not in STATS_METRICS:
+        raise ValueError(f"metric must be one of {', '.join(STATS_METRICS)}")
+    field = params.get('field', 'src_ip')
+    if field not in TOP_FIELDS:
+        raise ValueError(f"field must be one of {', '.join(TOP_FIELDS)}")
+    if metric in SKETCH_METRICS and field not in SKETCH_FIELDS:
+        raise ValueError(f"{metric} field must be one of {', '.join(SKETCH_FIELDS)}")
+    return {
+        'metric': metric,
+        'field': field,
+        'n': int(params.get('n', 10)),
+        'interval': int(params.get('interval', 60)),
+    }
+
+
+def format_time(ts):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+
+
+def build_stats(index, snapshot, segments, manifest, query, stats_query):
+    """Answer a /stats request from the live and closed segment rollups"""
+    start_ts, end_ts = query['from'], query['to']
+    metric = stats_query['metric']
+    field = stats_query['field']
+
+    # The rollup is updated by refresh() in other request threads
+    with index.lock:
+        rollups = [index.rollup] + segments.rollups(manifest)
+        if metric == 'total':
+            return {'count': sum(rollup.total(start_ts, end_ts) for rollup in rollups)}
+
+        if metric == 'timeseries':
+            series = Counter()
+            for rollup in rollups:
+                series.update(dict(rollup.timeseries(stats_query['interval'],
+                                                     start_ts, end_ts)))
+            return [{'time': format_time(bucket), 'count': count}
+                    for bucket, count in sorted(series.items())]
+
+        if metric == 'event_types':
+            counts = Counter()
+            for rollup in rollups:
+                counts.update(rollup.event_type_counts(start_ts, end_ts))
+            return [{'event_type': event_type, 'count': count}
+                    for event_type, count in counts.most_common()]
+
+        if metric == 'cardinality':
+            return format_distinct(merged_distinct(rollups, field, start_ts, end_ts))
+
+        if metric == 'heavy_hitters':
+            top = merged_top(rollups, field, start_ts, end_ts)
+            return [{field: value, 'count': count, 'error': top.error}
+                    for value, count in top.top(stats_query['n'])]
+
+        if start_ts is None and end_ts is None:
+            counter = Counter()
+            for rollup in rollups:
+                counter.update(rollup.top[field])
+            return format_counter(counter, metric, field, stats_query['n'])
+
+    # Value counters are kept for the whole history only
+    ranged = Rollup(with_sketches=False)
+    for _, log_entry in segments.iter_entries(manifest, start_ts, end_ts):
+        ranged.add(log_entry, math.nan)
+    keys = snapshot['keys']
+    for _, values in index.iter_rows(snapshot, start_ts, end_ts):
+        ranged.add(dict(zip(keys, values)), math.nan)
+    return format_counter(ranged.top[field], metric, field, stats_query['n'])
+
+
+def format_distinct(distinct):
+    count = distinct.count()
+    error = distinct.error()
+    return {'count': round(count), 'error': round(error, 4),
+            'lower': round(count * (1 - 2 * error)),
+            'upper': round(count * (1 + 2 * error))}
+
+
+def format_counter(counter, metric, field, n):
+    if metric == 'distinct':
+        return {'count': len(counter)}
+    return [{field: value, 'count': count}
+            for value, count in counter.most_common(n)]
+
+
+def prune_precompressed():
+    """Delete the least recently written precompressed bodies over budget"""
+    files = []
+    now = time.time()
+    for name in os.listdir(PRECOMPRESSED_DIR):
+        try:
+            st = os.stat(os.path.join(PRECOMPRESSED_DIR, name))
+        except OSError:
+            continue
+        if name.endswith(TMP_SUFFIX) and now - st.st_mtime < STALE_TMP_SECONDS:
+            # Still being streamed; older ones were left by a killed server
+            continue
+        files.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in files)
+    for _, size, name in sorted(files):
+        if total <= PRECOMPRESSED_BUDGET:
+            break
+        try:
+            os.remove(os.path.join(PRECOMPRESSED_DIR, name))
+        except OSError:
+            pass
+        total -= size
+
 
 class LogHandler(BaseHTTPRequestHandler):
     LOG_DIR = "/logs"
-    
+    protocol_version = 'HTTP/1.1'
+    _headers_sent = False
+    _content_type = 'application/json'
+
     def do_GET(self):
         # Parse the path
         parsed_path = urlparse(self.path)
         path = parsed_path.path.lstrip('/')
-        
+        stats = path.startswith(STATS_PREFIX)
+        if stats:
+            path = path[len(STATS_PREFIX):]
+        events = not stats and path == EVENTS_PATH
+        attacker = None
+        if not stats and path.startswith(ATTACKERS_PREFIX):
+            attacker = path[len(ATTACKERS_PREFIX):]
+        # Answered with one JSON document rather than an array of records
+        document = stats or attacker is not None
+
         # Build full file path
         file_path = os.path.join(self.LOG_DIR, path)
-        
+
+        if events or attacker is not None:
+            if STORE_BACKEND != 'sqlite':
+                self.send_error(503, f"/{path} needs STORE_BACKEND=sqlite")
+                return
+            if attacker == '':
+                self.send_error(400, "Missing attacker IP")
+                return
         # Check if file exists and is a JSON file
-        if not os.path.exists(file_path):
+        elif not os.path.exists(file_path):
             self.send_error(404, "File not found")
             return
-        
-        if not file_path.endswith('.json'):
+
+        elif not file_path.endswith('.json'):
             self.send_error(400, "Only JSON files are supported")
             return
-        
+
+        try:
+            query = parse_query(parsed_path.query)
+            stats_query = parse_stats_query(parsed_path.query) if stats else None
+        except ValueError as e:
+            self.send_error(400, f"Invalid query: {str(e)}")
+            return
+
+        if not document and query['format'] == 'arrow':
+            self._content_type = ARROW_CONTENT_TYPE
+        encoding = choose_encoding(self.headers.get('Accept-Encoding'))
         try:
-            # Read NDJSON file and convert to JSON array
-            logs = []
-            all_keys = set()
-            raw_logs = []
-            
-            # First pass: collect all unique keys
-            with open(file_path, 'r') as f:
-                for i, line in enumerate(f, 1):
-                    line = line.strip()
-                    if line:
-                        try:
-                            log_entry = json.loads(line)
-                            all_keys.update(log_entry.keys())
-                            raw_logs.append((i, log_entry))
-                        except json.JSONDecodeError:
-                            continue
-            
-            # Second pass: normalize all entries to have the same keys
-            for i, log_entry in raw_logs:
-                # Add missing keys with None values
-                for key in all_keys:
-                    if key not in log_entry:
-                        log_entry[key] = None
-                
-                # Add visualization fields
-                log_entry['count'] = 1
-                log_entry['id'] = i
-                logs.append(log_entry)
-            
-            # Send response
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
-            self.send_header('Cache-Control', 'no-cache')
-            self.end_headers()
-            
-            # Write JSON array
-            self.wfile.write(json.dumps(logs).encode())
-            
+            store = get_store() if STORE_BACKEND == 'sqlite' else None
+            if events:
+                snapshot = store.snapshot()
+                etag = make_etag(snapshot, path, query, encoding)
+
+                def get_records():
+                    return store.iter_events(query)
+            elif attacker is not None:
+                snapshot = store.snapshot()
+                etag = make_etag(snapshot, path, query, encoding)
+
+                def get_stats():
+                    return store.timeline(attacker, query)
+            elif store is not None and path in store.ready:
+                snapshot = store.snapshot(path)
+                etag = make_etag(snapshot, path, stats, query, stats_query, encoding)
+
+                def get_stats():
+                    return store.stats(path, query, stats_query)
+
+                def get_records():
+                    return store.iter_records(path, query)
+            else:
+                store = None
+                index = get_index(file_path, path)
+                segments = get_segments(file_path, path)
+                snapshot, manifest = segments.view(index)
+                etag = make_etag(snapshot, path, stats, query, stats_query, encoding,
+                                 manifest_identity(manifest))
+
+                def get_stats():
+                    return build_stats(index, snapshot, segments, manifest, query, stats_query)
+
+                def get_records():
+                    return iter_records(index, snapshot, segments, manifest, query)
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                self._send_not_modified(etag)
+                return
+
+            disk_path = None
+            if (PRECOMPRESS_IMMUTABLE and store is None and encoding != 'identity'
+                    and query['from'] is None and query['to'] is None
+                    and time.time() - snapshot['mtime_ns'] / 1e9 > IMMUTABLE_AFTER):
+                disk_path = os.path.join(PRECOMPRESSED_DIR,
+                                         etag.strip('"') + '.' + encoding)
+
+            body = RESPONSE_CACHE.get(etag)
+            if body is not None:
+                self._send_body(body, etag, encoding)
+            elif disk_path and os.path.exists(disk_path):
+                self._send_file(disk_path, etag, encoding)
+            elif document:
+                body = json.dumps(get_stats()).encode()
+                body = compress(body, encoding)
+                RESPONSE_CACHE.put(etag, body)
+                self._send_body(body, etag, encoding)
+            elif query['format'] != 'rows':
+                records = get_records()
+                if query['format'] == 'arrow':
+                    body = compress(to_arrow_ipc(records), encoding)
+                else:
+                    body = compress(to_column_json(records), encoding)
+                RESPONSE_CACHE.put(etag, body)
+                self._send_body(body, etag, encoding)
+            else:
+                records = get_records()
+                if STREAMING:
+                    self._send_streaming(records, etag, encoding, disk_path)
+                else:
+                    self._send_buffered(records, etag, encoding)
         except Exception as e:
-            self.send_error(500, f"Internal server error: {str(e)}")
-    
+            if self._headers_sent:
+                # Too late for an error status; drop the connection so the
+                # client sees a truncated chunked body instead of bad JSON.
+                self.close_connection = True
+            else:
+                self.send_error(500, f"Internal server error: {str(e)}")
+
+    def _send_headers(self, etag, encoding, extra=()):
+        self.send_response(200)
+        self.send_header('Content-Type', self._content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        # Clients may keep the body but must revalidate it with the ETag
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+        self._headers_sent = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+
+    def _send_streaming(self, records, etag, encoding, disk_path=None):
+        """Write the JSON array as it is produced using chunked encoding
+
+        Output is compressed incrementally when an encoding was negotiated.
+        Bodies small enough for the response cache are kept while streaming
+        and stored once complete; with disk_path the compressed body is also
+        written there for later requests.
+        """
+        self._send_headers(etag, encoding, [('Transfer-Encoding', 'chunked')])
+
+        compressor = Compressor(encoding)
+        kept = []
+        kept_size = 0
+        disk_file = None
+        if disk_path:
+            os.makedirs(PRECOMPRESSED_DIR, exist_ok=True)
+            # Unique per request, so concurrent streams of one body never
+            # share a temp file; renamed into place only when complete
+            fd, tmp_path = tempfile.mkstemp(dir=PRECOMPRESSED_DIR, suffix=TMP_SUFFIX)
+            disk_file = os.fdopen(fd, 'wb')
+        completed = False
+
+        def emit(data):
+            nonlocal kept, kept_size
+            if not data:
+                return
+            self._write_chunk(data)
+            if disk_file:
+                disk_file.write(data)
+            if kept is not None:
+                kept.append(data)
+                kept_size += len(data)
+                if kept_size > MAX_ENTRY_SIZE:
+                    kept = None
+
+        try:
+            buf = bytearray(b'[')
+            first = True
+            for log_entry in records:
+                if not first:
+                    buf += b', '
+                first = False
+                buf += json.dumps(log_entry).encode()
+                if len(buf) >= CHUNK_SIZE:
+                    emit(compressor.compress(bytes(buf)))
+                    buf.clear()
+            buf += b']'
+            emit(compressor.compress(bytes(buf)))
+            emit(compressor.flush())
+            self.wfile.write(b'0\r\n\r\n')
+            completed = True
+        finally:
+            if disk_file:
+                disk_file.close()
+                if completed:
+                    os.replace(tmp_path, disk_path)
+                else:
+                    # Client went away or a record failed: drop the partial body
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+        if disk_file:
+            prune_precompressed()
+        if kept is not None:
+            RESPONSE_CACHE.put(etag, b''.join(kept))
+
+    def _send_buffered(self, records, etag, encoding):
+        body = compress(json.dumps(list(records)).encode(), encoding)
+        RESPONSE_CACHE.put(etag, body)
+        self._send_body(body, etag, encoding)
+
+    def _send_body(self, body, etag, encoding):
+        self._send_headers(etag, encoding, [('Content-Length', str(len(body)))])
+        self.wfile.write(body)
+
+    def _send_file(self, path, etag, encoding):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._send_headers(etag, encoding, [('Content-Length', str(size))])
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def _send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
-    
+
     def log_message(self, format, *args):
         # Suppress default logging
         pass
 
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that serves connections from a bounded thread pool
+
+    A slow parse of one log no longer blocks requests for the others;
+    requests for the same log wait on its index lock and share one refresh.
+    """
+    # Grafana fires every panel of a dashboard at once
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=WORKERS):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def make_server(host='0.0.0.0', port=8080):
+    return PooledHTTPServer((host, port), LogHandler)
+
+
 if __name__ == '__main__':
-    server = HTTPServer(('0.0.0.0', 8080), LogHandler)
-    print("Log server running on port 8080")
+    server = make_server()
+    if STORE_BACKEND == 'sqlite':
+        get_store().follow(LogHandler.LOG_DIR)
+        print(f"Ingesting {', '.join(EVENT_SOURCES)} into {get_store().path}")
+    print(f"Log server running on port 8080 ({WORKERS} workers)")
     server.serve_forever()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Unified event schema for the SSH, web and FTP honeypot logs
+
+The producers write different shapes:
+  ssh_honeypot.json  event_type, src_ip, src_port, username/password, command
+  honeypot.json      remote_addr, method, path, user_agent, form_data (no
+                     event_type; logins are POSTs carrying a password)
+  ftp_parsed.json    protocol/src_port/dst_port from parse-dionaea-logs.py,
+                     or component/connection_id from parse_dionaea.py
+
+Each record is normalized once, at ingest, into an Event with the fields
+in FIELDS. event_type keeps the producer's value (web requests get
+http_request or login_attempt); action maps it onto one vocabulary shared
+by all protocols, so "every login attempt from this IP" is one query.
+"""
+import json
+import math
+import os
+
+from segmented_log import parse_timestamp
+
+FIELDS = ('ts', 'timestamp', 'protocol', 'event_type', 'action', 'src_ip',
+          'src_port', 'dst_port', 'session_id', 'username', 'password',
+          'command', 'method', 'path', 'user_agent')
+PROTOCOLS = ('ssh', 'http', 'ftp')
+ACTIONS = ('connect', 'disconnect', 'login', 'command', 'request', 'other')
+
+# Producer event types by action; anything else is "other"
+EVENT_ACTIONS = {
+    'connection': 'connect',
+    'connection_accept': 'connect',
+    'connection_rejected': 'connect',
+    'connection_close': 'disconnect',
+    'login_attempt': 'login',
+    'ftp_login_attempt': 'login',
+    'command': 'command',
+    'ftp_command': 'command',
+    'http_request': 'request',
+}
+FTP_LOGIN_COMMANDS = ('USER', 'PASS')
+
+
+class Event:
+    """One normalized honeypot event"""
+    __slots__ = FIELDS
+
+    def __init__(self, protocol, timestamp, event_type, src_ip=None, src_port=None,
+                 dst_port=None, session_id=None, username=None, password=None,
+                 command=None, method=None, path=None, user_agent=None):
+        ts = parse_timestamp(timestamp)
+        self.ts = None if math.isnan(ts) else ts
+        self.timestamp = None if timestamp is None else str(timestamp)
+        self.protocol = protocol
+        self.event_type = event_type
+        self.action = EVENT_ACTIONS.get(event_type, 'other')
+        self.src_ip = text(src_ip)
+        self.src_port = port(src_port)
+        self.dst_port = port(dst_port)
+        self.session_id = text(session_id)
+        self.username = text(username)
+        self.password = text(password)
+        self.command = text(command)
+        self.method = text(method)
+        self.path = text(path)
+        self.user_agent = text(user_agent)
+
+    def row(self):
+        """Field values in FIELDS order"""
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+
+def text(value):
+    """Normalize a field to a non-empty string or None"""
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        return json.dumps(value)
+    return value
+
+
+def port(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# ----------------------------------------------------------------------
+# Per-source normalizers
+# ----------------------------------------------------------------------
+
+def normalize_ssh(log_entry):
+    event_type = log_entry.get('event_type') or 'unknown'
+    return Event('ssh', log_entry.get('timestamp'), event_type,
+                 src_ip=log_entry.get('src_ip'),
+                 src_port=log_entry.get('src_port'),
+                 username=log_entry.get('username'),
+                 password=log_entry.get('password'),
+                 command=log_entry.get('command'))
+
+
+def normalize_web(log_entry):
+    form = log_entry.get('form_data')
+    if not isinstance(form, dict):
+        form = {}
+    login = log_entry.get('method') == 'POST' and 'password' in form
+    return Event('http', log_entry.get('timestamp'),
+                 log_entry.get('event_type') or ('login_attempt' if login else 'http_request'),
+                 src_ip=log_entry.get('remote_addr') or log_entry.get('src_ip'),
+                 username=form.get('username') if login else None,
+                 password=form.get('password') if login else None,
+                 method=log_entry.get('method'),
+                 path=log_entry.get('path'),
+                 user_agent=log_entry.get('user_agent'))
+
+
+def normalize_ftp(log_entry):
+    event_type = log_entry.get('event_type') or 'unknown'
+    command = log_entry.get('command')
+    if event_type == 'ftp_command' and command in FTP_LOGIN_COMMANDS:
+        # parse-dionaea-logs.py reports USER/PASS as plain commands
+        event_type = 'ftp_login_attempt'
+    return Event('ftp', log_entry.get('timestamp'), event_type,
+                 src_ip=log_entry.get('src_ip'),
+                 src_port=log_entry.get('src_port'),
+                 dst_port=log_entry.get('dst_port'),
+                 session_id=log_entry.get('connection_id'),
+                 username=log_entry.get('username'),
+                 password=log_entry.get('password'),
+                 command=command)
+
+
+def normalize_generic(log_entry):
+    """Fallback for logs of unknown origin: use whatever common fields exist"""
+    return Event(log_entry.get('protocol'), log_entry.get('timestamp'),
+                 log_entry.get('event_type') or 'unknown',
+                 src_ip=log_entry.get('src_ip') or log_entry.get('remote_addr'),
+                 src_port=log_entry.get('src_port'),
+                 dst_port=log_entry.get('dst_port'),
+                 session_id=log_entry.get('connection_id') or log_entry.get('session_id'),
+                 username=log_entry.get('username'),
+                 password=log_entry.get('password'),
+                 command=log_entry.get('command'),
+                 method=log_entry.get('method'),
+                 path=log_entry.get('path'),
+                 user_agent=log_entry.get('user_agent'))
+
+
+NORMALIZERS = {
+    'ssh_honeypot.json': normalize_ssh,
+    'honeypot.json': normalize_web,
+    'ftp_parsed.json': normalize_ftp,
+}
+
+
+def normalizer_for(source):
+    """Return the normalizer for a log path such as dionaea/ftp_parsed.json"""
+    return NORMALIZERS.get(os.path.basename(source), normalize_generic)
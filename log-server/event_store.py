@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+SQLite event store, an alternative backend for the log server
+
+With STORE_BACKEND=sqlite the log server tails the honeypot logs listed in
+EVENT_SOURCES into one SQLite database (WAL mode, so ingestion never blocks
+readers) and answers record and /stats requests with indexed queries
+instead of scanning files.
+
+Every record is normalized once, at ingest, into the unified schema of
+event_schema.py (protocol, event_type, action, src_ip, ports, session id,
+credentials, command, HTTP method/path/user agent) and stored as one row
+of the events table, next to the original record as JSON in data. Rows
+keep the record ids of the file backend (see segments.py), so switching
+backends does not renumber anything. /events queries the normalized
+columns across every source at once, e.g. everything one IP did over SSH,
+FTP and HTTP, with the (src_ip, ts) index. The same ingest pass groups
+each IP's events into cross-protocol sessions (see sessions.py), which
+/attackers/<ip> returns as a timeline.
+
+Ingestion reuses the per-file LogIndex and the segment manifest: each pass
+reads only records with an id above the source's watermark. A log that was
+replaced (ids went backwards or the live file changed without a rotation)
+is re-ingested from scratch.
+
+  python3 event_store.py            # ingest once, e.g. to backfill
+  python3 event_store.py --follow   # keep ingesting every INGEST_INTERVAL
+"""
+import os
+import json
+import sqlite3
+import argparse
+import threading
+import time
+from operator import itemgetter
+
+from event_schema import FIELDS, normalizer_for
+from log_index import STATE_DIR, get_index
+from segments import SEGMENT_ID_STRIDE, get_segments, live_id_base
+from sessions import SCHEMA as SESSION_SCHEMA, SessionTracker, timeline
+
+EVENT_DB = os.environ.get('EVENT_DB', os.path.join(STATE_DIR, 'events.db'))
+EVENT_SOURCES = [source.strip() for source in os.environ.get(
+    'EVENT_SOURCES',
+    'ssh-honeypot/ssh_honeypot.json,web-honeypot/honeypot.json,dionaea/ftp_parsed.json'
+).split(',') if source.strip()]
+INGEST_INTERVAL = float(os.environ.get('INGEST_INTERVAL', '5'))
+INGEST_BATCH = 5000
+# Bumped when the schema changes; an older database is rebuilt from the logs
+STORE_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    source     TEXT NOT NULL,
+    record_id  INTEGER NOT NULL,
+    ts         REAL,
+    timestamp  TEXT,
+    protocol   TEXT,
+    event_type TEXT,
+    action     TEXT,
+    src_ip     TEXT,
+    src_port   INTEGER,
+    dst_port   INTEGER,
+    session_id TEXT,
+    username   TEXT,
+    password   TEXT,
+    command    TEXT,
+    method     TEXT,
+    path       TEXT,
+    user_agent TEXT,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (source, record_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_src_ip ON events (src_ip, ts);
+CREATE INDEX IF NOT EXISTS idx_events_event_type ON events (event_type, ts);
+CREATE INDEX IF NOT EXISTS idx_events_username ON events (username);
+CREATE TABLE IF NOT EXISTS sources (
+    source       TEXT PRIMARY KEY,
+    last_id      INTEGER NOT NULL,
+    records      INTEGER NOT NULL,
+    keys         TEXT NOT NULL,
+    live_base    INTEGER NOT NULL,
+    live_inode   INTEGER,
+    live_gen     INTEGER,
+    live_records INTEGER NOT NULL,
+    resets       INTEGER NOT NULL
+);
+"""
+
+COLUMNS = ('record_id',) + FIELDS + ('data',)
+INSERT = 'INSERT OR REPLACE INTO events (source, %s) VALUES (?, %s)' % (
+    ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS)))
+# Query parameter -> column or expression it filters with a list of values.
+# /<log> requests match the record's own event_type, as the file backend
+# does, not the normalized one that /events filters on.
+RECORD_FILTERS = (('event_type', "json_extract(data, '$.event_type')"),
+                  ('src_ip', 'src_ip'))
+EVENT_FILTERS = (('src_ip', 'src_ip'), ('event_type', 'event_type'),
+                 ('protocol', 'protocol'), ('action', 'action'))
+# Columns of an event row that sessions are built from
+session_fields = itemgetter(*(2 + FIELDS.index(field)
+                              for field in ('src_ip', 'ts', 'protocol', 'action')))
+
+
+def event_row(source, normalize, record_id, log_entry):
+    """Columns of one record in the unified schema"""
+    return ((source, record_id) + normalize(log_entry).row()
+            + (json.dumps(log_entry, separators=(',', ':')),))
+
+
+class EventStore:
+    """One SQLite database of events from every ingested log"""
+
+    def __init__(self, path=EVENT_DB):
+        self.path = path
+        self.local = threading.local()
+        self.ingest_lock = threading.Lock()
+        # Sources that completed an ingest pass since this process started
+        self.ready = set()
+        self.analyzed_rows = 0
+        self.sessions = SessionTracker()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        db = self.connection()
+        if db.execute('PRAGMA user_version').fetchone()[0] != STORE_VERSION:
+            db.executescript('DROP TABLE IF EXISTS events; DROP TABLE IF EXISTS sources;'
+                             ' DROP TABLE IF EXISTS sessions;')
+            db.execute(f'PRAGMA user_version = {STORE_VERSION}')
+        db.executescript(SCHEMA + SESSION_SCHEMA)
+
+    def connection(self):
+        """Return this thread's connection"""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    def source_state(self, source):
+        row = self.connection().execute(
+            'SELECT last_id, records, keys, live_base, live_inode, live_gen,'
+            ' live_records, resets FROM sources WHERE source = ?', (source,)).fetchone()
+        if row is None:
+            return None
+        state = dict(zip(('last_id', 'records', 'keys', 'live_base', 'live_inode',
+                          'live_gen', 'live_records', 'resets'), row))
+        state['keys'] = json.loads(state['keys'])
+        return state
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def ingest(self, log_dir, sources=EVENT_SOURCES):
+        """Ingest new records of every source; returns how many were added"""
+        added = 0
+        for source in sources:
+            file_path = os.path.join(log_dir, source)
+            if os.path.exists(file_path):
+                added += self.ingest_source(file_path, source)
+                self.ready.add(source)
+        if added:
+            self._analyze()
+        return added
+
+    def _analyze(self):
+        """Refresh planner statistics whenever the store has doubled
+
+        Without them SQLite walks a whole source in id order rather than
+        using the timestamp index for a time range.
+        """
+        db = self.connection()
+        rows = db.execute('SELECT COALESCE(SUM(records), 0) FROM sources').fetchone()[0]
+        if rows >= 2 * self.analyzed_rows:
+            db.execute('ANALYZE')
+            db.commit()
+            self.analyzed_rows = rows
+
+    def ingest_source(self, file_path, source):
+        with self.ingest_lock:
+            index = get_index(file_path, source)
+            snapshot, manifest = get_segments(file_path, source).view(index)
+            return self._ingest(file_path, source, index, snapshot, manifest)
+
+    def _ingest(self, file_path, source, index, snapshot, manifest):
+        db = self.connection()
+        state = self.source_state(source)
+        base = live_id_base(manifest)
+        if state is not None and (
+                base + snapshot['lines'] < state['last_id']
+                or (base == state['live_base']
+                    and (snapshot['inode'], snapshot['generation'])
+                    != (state['live_inode'], state['live_gen']))):
+            # The log was replaced rather than appended to or rotated
+            with db:
+                db.execute('DELETE FROM events WHERE source = ?', (source,))
+                self.sessions.rebuild(db)
+            state = {'last_id': 0, 'records': 0, 'keys': [], 'live_records': 0,
+                     'live_base': None, 'resets': state['resets'] + 1}
+        if state is None:
+            state = {'last_id': 0, 'records': 0, 'keys': [], 'live_records': 0,
+                     'live_base': None, 'resets': 0}
+
+        keys = state['keys']
+        known = set(keys)
+        last_id = state['last_id']
+        live_records = state['live_records'] if state['live_base'] == base else 0
+        segments = get_segments(file_path, source)
+        normalize = normalizer_for(source)
+
+        def new_records():
+            nonlocal live_records
+            for segment in manifest['segments'] if manifest else ():
+                if (segment['seq'] + 1) * SEGMENT_ID_STRIDE <= last_id:
+                    continue
+                for record_id, log_entry in segments.iter_entries({'segments': [segment]}):
+                    if record_id > last_id:
+                        yield record_id, log_entry
+            live_keys = snapshot['keys']
+            for line_no, values in index.iter_rows(snapshot, first=live_records):
+                live_records += 1
+                if base + line_no > last_id:
+                    yield base + line_no, dict(zip(live_keys, values))
+
+        added = 0
+        batch = []
+        for record_id, log_entry in new_records():
+            for key in log_entry:
+                if key not in known:
+                    known.add(key)
+                    keys.append(key)
+            batch.append(event_row(source, normalize, record_id, log_entry))
+            last_id = record_id
+            if len(batch) >= INGEST_BATCH:
+                added += self._commit(source, batch, state, last_id, keys, base,
+                                      snapshot, live_records)
+                batch = []
+        added += self._commit(source, batch, state, last_id, keys, base,
+                              snapshot, live_records)
+        return added
+
+    def _commit(self, source, batch, state, last_id, keys, base, snapshot, live_records):
+        """Insert a batch, update its sessions and advance the source's
+        watermark atomically"""
+        db = self.connection()
+        try:
+            with db:
+                db.executemany(INSERT, batch)
+                for row in batch:
+                    self.sessions.add(db, *session_fields(row))
+                self.sessions.flush(db)
+                db.execute(
+                    'INSERT OR REPLACE INTO sources (source, last_id, records, keys,'
+                    ' live_base, live_inode, live_gen, live_records, resets)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (source, last_id, state['records'] + len(batch), json.dumps(keys),
+                     base, snapshot['inode'], snapshot['generation'], live_records,
+                     state['resets']))
+        except Exception:
+            # The cached sessions no longer match the rolled back database
+            self.sessions.reset()
+            raise
+        state['records'] += len(batch)
+        return len(batch)
+
+    def follow(self, log_dir, interval=INGEST_INTERVAL):
+        """Ingest forever in a background thread"""
+        def run():
+            while True:
+                try:
+                    self.ingest(log_dir)
+                except Exception as e:
+                    print(f"[!] Event store ingest failed: {e}")
+                time.sleep(interval)
+        thread = threading.Thread(target=run, name='event-store-ingest', daemon=True)
+        thread.start()
+        return thread
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def snapshot(self, source=None):
+        """Identity of a source's ingested data (or of all sources), shaped
+        for make_etag()"""
+        if source is None:
+            rows = self.connection().execute(
+                'SELECT source, last_id, records, resets FROM sources ORDER BY source').fetchall()
+            return {'inode': 'sqlite', 'size': sum(row[2] for row in rows),
+                    'mtime_ns': [row[:2] for row in rows],
+                    'generation': [row[3] for row in rows]}
+        state = self.source_state(source) or {'last_id': 0, 'records': 0, 'resets': 0}
+        return {'inode': 'sqlite', 'size': state['records'],
+                'mtime_ns': state['last_id'], 'generation': state['resets']}
+
+    def _where(self, source, query, filters=RECORD_FILTERS):
+        sql = ' WHERE source = ?' if source is not None else ' WHERE 1'
+        params = [source] if source is not None else []
+        if query['from'] is not None:
+            sql += ' AND ts >= ?'
+            params.append(query['from'])
+        if query['to'] is not None:
+            sql += ' AND ts <= ?'
+            params.append(query['to'])
+        for name, column in filters:
+            values = query.get(name)
+            if values is not None:
+                sql += ' AND %s IN (%s)' % (column, ', '.join('?' * len(values)))
+                params.extend(sorted(values))
+        return sql, params
+
+    def iter_records(self, source, query):
+        """Yield records like convert_logs.iter_records, in record id order"""
+        if query['limit'] == 0:
+            return
+        state = self.source_state(source)
+        keys = state['keys'] if state else []
+        where, params = self._where(source, query)
+        sql = 'SELECT record_id, data FROM events' + where + ' ORDER BY record_id'
+        sql += ' LIMIT ? OFFSET ?'
+        params += [-1 if query['limit'] is None else query['limit'], query['offset']]
+        fields = query['fields']
+        for record_id, data in self.connection().execute(sql, params):
+            log_entry = json.loads(data)
+            # Add missing keys with None values
+            if len(log_entry) < len(keys):
+                for key in keys:
+                    if key not in log_entry:
+                        log_entry[key] = None
+
+            # Add visualization fields
+            log_entry['count'] = 1
+            log_entry['id'] = record_id
+
+            if fields:
+                log_entry = {field: log_entry.get(field) for field in fields}
+            yield log_entry
+
+    def timeline(self, src_ip, query):
+        """Sessions of one IP across every source, see sessions.timeline()"""
+        return timeline(self.connection(), src_ip, query['from'], query['to'],
+                        query['fields'])
+
+    def iter_events(self, query):
+        """Yield normalized events of every source in timestamp order
+
+        A src_ip filter is answered from the (src_ip, ts) index, so one
+        attacker's SSH, FTP and HTTP activity is a single indexed lookup.
+        """
+        if query['limit'] == 0:
+            return
+        where, params = self._where(None, query, EVENT_FILTERS)
+        sql = ('SELECT source, record_id, %s FROM events' % ', '.join(FIELDS)
+               + where + ' ORDER BY ts, source, record_id LIMIT ? OFFSET ?')
+        params += [-1 if query['limit'] is None else query['limit'], query['offset']]
+        fields = query['fields']
+        for row in self.connection().execute(sql, params):
+            event = dict(zip(FIELDS, row[2:]))
+            event['source'] = row[0]
+            event['count'] = 1
+            event['id'] = row[1]
+            if fields:
+                event = {field: event.get(field) for field in fields}
+            yield event
+
+    def stats(self, source, query, stats_query):
+        """Answer a /stats request; same shapes as convert_logs.build_stats
+
+        from/to are applied exactly rather than at one-minute granularity,
+        and cardinality/heavy_hitters are exact counts with an error of 0.
+        """
+        db = self.connection()
+        where, params = self._where(source, dict(query, event_type=None, src_ip=None))
+        metric = stats_query['metric']
+        field = stats_query['field']
+
+        if metric == 'total':
+            return {'count': db.execute('SELECT COUNT(*) FROM events' + where,
+                                        params).fetchone()[0]}
+
+        if metric == 'timeseries':
+            interval = max(60, stats_query['interval'] // 60 * 60)
+            rows = db.execute(
+                'SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, COUNT(*) FROM events'
+                + where + ' AND ts IS NOT NULL GROUP BY bucket ORDER BY bucket',
+                [interval, interval] + params)
+            return [{'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(bucket)),
+                     'count': count} for bucket, count in rows]
+
+        if metric == 'event_types':
+            rows = db.execute(
+                "SELECT COALESCE(event_type, 'unknown') AS value, COUNT(*) AS n"
+                " FROM events" + where + " GROUP BY value ORDER BY n DESC, MIN(record_id)",
+                params)
+            return [{'event_type': value, 'count': count} for value, count in rows]
+
+        # field is one of TOP_FIELDS, which are all columns
+        if metric in ('distinct', 'cardinality'):
+            count = db.execute(
+                f'SELECT COUNT(DISTINCT {field}) FROM events' + where, params).fetchone()[0]
+            if metric == 'cardinality':
+                return {'count': count, 'error': 0, 'lower': count, 'upper': count}
+            return {'count': count}
+        rows = db.execute(
+            f'SELECT {field}, COUNT(*) AS n FROM events' + where
+            + f' AND {field} IS NOT NULL GROUP BY {field} ORDER BY n DESC, MIN(record_id)'
+            ' LIMIT ?', params + [stats_query['n']])
+        if metric == 'heavy_hitters':
+            return [{field: value, 'count': count, 'error': 0} for value, count in rows]
+        return [{field: value, 'count': count} for value, count in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(path=EVENT_DB):
+    """Return the shared EventStore instance"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EventStore(path)
+        return _store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingest honeypot logs into SQLite')
+    parser.add_argument('--log-dir', default='/logs')
+    parser.add_argument('--follow', action='store_true',
+                        help=f'keep ingesting every {INGEST_INTERVAL:g} seconds')
+    args = parser.parse_args()
+
+    store = get_store()
+    while True:
+        started = time.time()
+        added = store.ingest(args.log_dir)
+        print(f"Ingested {added} events into {store.path} ({time.time() - started:.1f}s)")
+        if not args.follow:
+            break
+        time.sleep(INGEST_INTERVAL)
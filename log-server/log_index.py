@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Persistent sidecar index for NDJSON log files
+
+Each indexed file gets a directory in STATE_DIR holding:
+  meta.json      - file identity (inode, size, mtime), key union and counters
+  entries.N.bin  - fixed-size (source offset, row offset, timestamp, running
+                   max timestamp) tuple per record
+  rows.N.jsonl   - already-parsed records as compact JSON value arrays
+  rollup.json    - pre-aggregated counters (see rollups.py), saved at most
+                   every ROLLUP_SAVE_INTERVAL seconds and caught up from
+                   the stored rows on startup
+
+N is a generation number bumped whenever the file is re-indexed. The
+previous generation is kept until the next re-index so requests still
+reading an older snapshot are not cut off. refresh() is serialized per
+file, so concurrent requests for the same log share a single parse.
+
+Keys are append-only, so a row only stores values for the keys known when
+it was parsed; missing trailing values are padded with None on read.
+Repeat requests only parse bytes appended since the last refresh.
+
+Logs are appended in (nearly) timestamp order. The running maximum is
+monotonic, so the first record of a time range is found by binary search
+over it; the largest observed step backwards in time ("disorder") bounds
+how far past the end of the range a scan has to continue.
+"""
+import os
+import json
+import math
+import struct
+import threading
+import time
+
+from rollups import Rollup
+from segmented_log import parse_timestamp
+
+STATE_DIR = os.environ.get('STATE_DIR', '/app/state')
+INDEX_VERSION = 3
+
+ENTRY = struct.Struct('<qqdd')
+FINGERPRINT_SIZE = 64
+ROLLUP_SAVE_INTERVAL = 60
+
+
+class LogIndex:
+    """Byte-offset index and compact record store for one NDJSON file"""
+
+    def __init__(self, file_path, rel_path):
+        self.file_path = file_path
+        name = rel_path.replace('/', '__') + '.idx'
+        self.dir = os.path.join(STATE_DIR, name)
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+        self.rollup_path = os.path.join(self.dir, 'rollup.json')
+        self.meta = None
+        self.rollup = None
+        self._rollup_saved_at = 0
+        self.lock = threading.Lock()
+
+    def entries_path(self, generation):
+        return os.path.join(self.dir, f'entries.{generation}.bin')
+
+    def rows_path(self, generation):
+        return os.path.join(self.dir, f'rows.{generation}.jsonl')
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _empty_meta(self, st, generation):
+        return {
+            'version': INDEX_VERSION,
+            'generation': generation,
+            'inode': st.st_ino,
+            'size': 0,
+            'mtime_ns': 0,
+            'indexed': 0,
+            'lines': 0,
+            'records': 0,
+            'rows_size': 0,
+            'keys': [],
+            'fingerprint': '',
+            'max_ts': -math.inf,
+            'disorder': 0.0,
+        }
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != INDEX_VERSION:
+            return None
+        # Drop anything written after the last committed meta (e.g. a crash
+        # between appending rows and saving meta).
+        try:
+            with open(self.entries_path(meta['generation']), 'r+b') as f:
+                f.truncate(meta['records'] * ENTRY.size)
+            with open(self.rows_path(meta['generation']), 'r+b') as f:
+                f.truncate(meta['rows_size'])
+        except OSError:
+            return None
+        return meta
+
+    def _save_meta(self, meta):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _reset(self, st, old_meta):
+        os.makedirs(self.dir, exist_ok=True)
+        generation = old_meta['generation'] + 1 if old_meta else 0
+        for name in os.listdir(self.dir):
+            parts = name.split('.')
+            if (len(parts) == 3 and parts[0] in ('entries', 'rows')
+                    and parts[1].isdigit() and int(parts[1]) < generation - 1):
+                os.remove(os.path.join(self.dir, name))
+        for path in (self.entries_path(generation), self.rows_path(generation)):
+            open(path, 'wb').close()
+        if os.path.exists(self.rollup_path):
+            os.remove(self.rollup_path)
+        self.rollup = Rollup()
+        meta = self._empty_meta(st, generation)
+        self._save_meta(meta)
+        return meta
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def _is_append(self, meta, st):
+        """True if the file still starts with everything we indexed"""
+        if meta['inode'] != st.st_ino or st.st_size < meta['indexed']:
+            return False
+        if meta['indexed'] == 0:
+            return True
+        fp_len = len(bytes.fromhex(meta['fingerprint']))
+        with open(self.file_path, 'rb') as f:
+            f.seek(meta['indexed'] - fp_len)
+            return f.read(fp_len).hex() == meta['fingerprint']
+
+    def refresh(self):
+        """Bring the index up to date and return a snapshot of its meta
+
+        Unchanged files (same inode, size and mtime) cost a single stat().
+        Appended files only have their new complete lines parsed; rotated,
+        truncated or rewritten files are re-indexed from the start.
+        """
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self):
+        st = os.stat(self.file_path)
+        meta = self.meta or self._load_meta()
+        if (meta and meta['inode'] == st.st_ino and meta['size'] == st.st_size
+                and meta['mtime_ns'] == st.st_mtime_ns):
+            self.meta = meta
+            self._sync_rollup(meta)
+            return self._snapshot(meta)
+
+        if not meta or not self._is_append(meta, st):
+            meta = self._reset(st, meta)
+
+        self._sync_rollup(meta)
+        self._index_tail(meta, st)
+        self._save_meta(meta)
+        self.meta = meta
+        if time.monotonic() - self._rollup_saved_at >= ROLLUP_SAVE_INTERVAL:
+            self.rollup.save(self.rollup_path)
+            self._rollup_saved_at = time.monotonic()
+        return self._snapshot(meta)
+
+    def _snapshot(self, meta):
+        snapshot = dict(meta)
+        snapshot['keys'] = list(meta['keys'])
+        return snapshot
+
+    def _sync_rollup(self, meta):
+        """Load the rollup and replay stored rows it has not counted yet"""
+        if self.rollup is None:
+            self.rollup = Rollup.load(self.rollup_path)
+            self._rollup_saved_at = time.monotonic()
+        if self.rollup.records > meta['records']:
+            self.rollup = Rollup()
+        if self.rollup.records < meta['records']:
+            keys = meta['keys']
+            for _, values in self.iter_rows(meta, first=self.rollup.records):
+                log_entry = dict(zip(keys, values))
+                self.rollup.add(log_entry,
+                                parse_timestamp(log_entry.get('timestamp')))
+
+    def _index_tail(self, meta, st):
+        keys = meta['keys']
+        key_pos = {key: i for i, key in enumerate(keys)}
+        offset = meta['indexed']
+        line_no = meta['lines']
+        records = meta['records']
+        rows_size = meta['rows_size']
+        max_ts = meta['max_ts']
+        disorder = meta['disorder']
+        last_line = b''
+
+        with open(self.file_path, 'rb') as src, \
+                open(self.entries_path(meta['generation']), 'ab') as entries, \
+                open(self.rows_path(meta['generation']), 'ab') as rows:
+            src.seek(offset)
+            for raw in src:
+                # Leave a partially written trailing line for the next refresh
+                if not raw.endswith(b'\n'):
+                    break
+                line_offset = offset
+                offset += len(raw)
+                line_no += 1
+                last_line = raw
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    log_entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(log_entry, dict):
+                    continue
+
+                for key in log_entry:
+                    if key not in key_pos:
+                        key_pos[key] = len(keys)
+                        keys.append(key)
+                values = [None] * (max(key_pos[k] for k in log_entry) + 1
+                                   if log_entry else 0)
+                for key, value in log_entry.items():
+                    values[key_pos[key]] = value
+
+                ts = parse_timestamp(log_entry.get('timestamp'))
+                if not math.isnan(ts):
+                    if ts < max_ts:
+                        disorder = max(disorder, max_ts - ts)
+                    else:
+                        max_ts = ts
+
+                row = json.dumps([line_no] + values,
+                                 separators=(',', ':')).encode() + b'\n'
+                entries.write(ENTRY.pack(line_offset, rows_size, ts, max_ts))
+                self.rollup.add(log_entry, ts)
+                rows.write(row)
+                rows_size += len(row)
+                records += 1
+
+        if last_line:
+            meta['fingerprint'] = last_line[-FINGERPRINT_SIZE:].hex()
+        meta.update({
+            'inode': st.st_ino,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'indexed': offset,
+            'lines': line_no,
+            'records': records,
+            'rows_size': rows_size,
+            'max_ts': max_ts,
+            'disorder': disorder,
+        })
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def _find_start(self, entries, records, start_ts):
+        """Binary search for the first record whose running max >= start_ts"""
+        lo, hi = 0, records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entries.seek(mid * ENTRY.size)
+            running_max = ENTRY.unpack(entries.read(ENTRY.size))[3]
+            if running_max < start_ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_rows(self, snapshot, start_ts=None, end_ts=None, first=0):
+        """Yield (line_no, values) for records in a refresh() snapshot
+
+        With start_ts/end_ts (epoch seconds) only records whose timestamp
+        falls inside the range are parsed and yielded; records without a
+        timestamp are skipped in that case. first skips that many records.
+        """
+        records = snapshot['records']
+        stop_ts = None
+        if end_ts is not None:
+            stop_ts = end_ts + snapshot['disorder']
+        generation = snapshot['generation']
+        with open(self.entries_path(generation), 'rb') as entries, \
+                open(self.rows_path(generation), 'rb') as rows:
+            if start_ts is not None:
+                first = max(first, self._find_start(entries, records, start_ts))
+            entries.seek(first * ENTRY.size)
+            position = -1
+            for _ in range(first, records):
+                _, row_offset, ts, _ = ENTRY.unpack(entries.read(ENTRY.size))
+                if stop_ts is not None and ts > stop_ts:
+                    break
+                if start_ts is not None and not ts >= start_ts:
+                    continue
+                if end_ts is not None and not ts <= end_ts:
+                    continue
+                if row_offset != position:
+                    rows.seek(row_offset)
+                raw = rows.readline()
+                position = row_offset + len(raw)
+                row = json.loads(raw)
+                yield row[0], row[1:]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(file_path, rel_path):
+    """Return the shared LogIndex instance for a file"""
+    with _indexes_lock:
+        index = _indexes.get(file_path)
+        if index is None:
+            index = _indexes[file_path] = LogIndex(file_path, rel_path)
+        return index
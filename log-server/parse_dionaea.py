@@ -2,162 +2,301 @@
 """
 Dionaea FTP Log Parser
 Converts Dionaea text logs to JSON format for Grafana visualization
+
+Large logs (e.g. a backfill after an incident) can be parsed in parallel
+with --workers N: the file is mmap'ed and split into newline-aligned byte
+ranges that a process pool parses independently. The per-chunk results
+are chained in log order as they complete (so only chunks not yet written
+are held) and the username/password correlation, which spans chunks, is
+applied afterwards in one deterministic pass, so the output matches a
+single-process run even where the log's timestamps go backwards.
+
+Entries are produced by a generator pipeline and written as they are
+parsed. The per-connection username/password state is held in an LRU
+that drops a connection when it closes, after CONN_STATE_TTL seconds of
+log time without activity, or when more than CONN_STATE_MAX connections
+are tracked.
 """
+import io
 import re
 import json
+import mmap
+import itertools
+import argparse
 from datetime import datetime
 import os
-from collections import defaultdict
+from collections import Counter, OrderedDict
+from multiprocessing import Pool
+
+from dionaea_classifier import classify_line
 
 LOG_FILE = "/logs/dionaea/dionaea/dionaea.log"
 OUTPUT_FILE = "/app/ftp_parsed.json"  # Write to app directory (writable)
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", "1"))  # 0 uses every core
+CHUNK_BYTES = int(float(os.environ.get("PARSE_CHUNK_MB", "64")) * 1024 * 1024)
+CONN_STATE_MAX = int(os.environ.get("CONN_STATE_MAX", "100000"))
+CONN_STATE_TTL = float(os.environ.get("CONN_STATE_TTL", "3600"))
+
+# Close lines name the connection as "connection 0x..." rather than "con 0x..."
+CLOSED_CONNECTION = re.compile(r'connection\s+(0x[0-9a-f]+)')
 
 def parse_dionaea_log_line(line):
-    """Parse a single Dionaea log line and extract relevant information"""
-    try:
-        # Example log format: [02122025 11:53:15] ftp /dionaea/ftp.py:214-debug: b'USER anonymous\r\n'
-        
-        # Extract timestamp
-        timestamp_match = re.search(r'\[(\d{8})\s+(\d{2}:\d{2}:\d{2})\]', line)
-        if not timestamp_match:
-            return None
-        
-        date_str = timestamp_match.group(1)
-        time_str = timestamp_match.group(2)
-        
-        # Parse date: MMDDYYYY format
-        month = date_str[0:2]
-        day = date_str[2:4]
-        year = date_str[4:8]
-        timestamp = f"{year}-{month}-{day}T{time_str}Z"
-        
-        # Extract component and message
-        component_match = re.search(r'\]\s+(\w+)\s+', line)
-        component = component_match.group(1) if component_match else "unknown"
-        
-        # Check for FTP-specific events
-        event_type = "unknown"
-        username = None
-        password = None
-        command = None
-        connection_id = None
-        src_ip = None
-        
-        # Extract connection information
-        con_match = re.search(r'con\s+(0x[0-9a-f]+)', line)
-        if con_match:
-            connection_id = con_match.group(1)
-        
-        # Extract IP address if present
-        ip_match = re.search(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', line)
-        if ip_match:
-            src_ip = ip_match.group(1)
-        
-        if 'ftp' in line.lower():
-            event_type = "ftp_activity"
-            
-            # Extract FTP commands
-            if 'USER' in line:
-                user_match = re.search(r"USER\s+([^\r\n'\"]+)", line)
-                if user_match:
-                    username = user_match.group(1).strip()
-                    event_type = "ftp_login_attempt"
-                    command = "USER"
-            
-            elif 'PASS' in line:
-                pass_match = re.search(r"PASS\s+([^\r\n'\"]+)", line)
-                if pass_match:
-                    password = pass_match.group(1).strip()
-                    event_type = "ftp_login_attempt"
-                    command = "PASS"
-            
-            elif any(cmd in line for cmd in ['LIST', 'RETR', 'STOR', 'DELE', 'MKD', 'RMD']):
-                for cmd in ['LIST', 'RETR', 'STOR', 'DELE', 'MKD', 'RMD', 'CWD', 'PWD', 'SYST', 'QUIT']:
-                    if cmd in line:
-                        command = cmd
-                        event_type = "ftp_command"
-                        break
-        
-        elif 'connection' in line.lower():
-            if 'accept' in line.lower():
-                event_type = "connection_accept"
-            elif 'close' in line.lower() or 'disconnect' in line.lower():
-                event_type = "connection_close"
-            else:
-                event_type = "connection"
-        
-        # Build JSON entry
-        entry = {
-            "timestamp": timestamp,
-            "event_type": event_type,
-            "component": component,
-            "connection_id": connection_id,
-            "src_ip": src_ip,
-            "raw_message": line.strip()
-        }
-        
-        if username:
-            entry["username"] = username
-        if password:
-            entry["password"] = password
-        if command:
-            entry["command"] = command
-        
-        return entry
-        
-    except Exception as e:
+    """Parse a single Dionaea log line and extract relevant information
+
+    Returns None for lines that are not FTP or connection related.
+    """
+    # Example log format: [02122025 11:53:15] ftp /dionaea/ftp.py:214-debug: b'USER anonymous\r\n'
+    parsed = classify_line(line)
+    if parsed is None or parsed.timestamp is None:
         return None
 
-def parse_dionaea_logs():
-    """Parse Dionaea logs and convert to JSON"""
-    
-    if not os.path.exists(LOG_FILE):
-        print(f"Log file not found: {LOG_FILE}")
+    username = None
+    password = None
+    command = None
+
+    if parsed.ftp:
+        event_type = "ftp_activity"
+
+        # USER/PASS carry an argument; other commands are matched alone
+        if parsed.argument is not None:
+            event_type = "ftp_login_attempt"
+            command = parsed.command
+            if command == "USER":
+                username = parsed.argument.strip()
+            else:
+                password = parsed.argument.strip()
+        elif parsed.command:
+            event_type = "ftp_command"
+            command = parsed.command
+
+    elif parsed.state == 'accept':
+        event_type = "connection_accept"
+    elif parsed.state == 'close':
+        event_type = "connection_close"
+    else:
+        event_type = "connection"
+
+    # Build JSON entry
+    entry = {
+        "timestamp": parsed.timestamp + "Z",
+        "event_type": event_type,
+        "component": parsed.component or "unknown",
+        "connection_id": parsed.connection_id,
+        "src_ip": parsed.first_ip,
+        "raw_message": line.strip()
+    }
+
+    if username:
+        entry["username"] = username
+    if password:
+        entry["password"] = password
+    if command:
+        entry["command"] = command
+
+    return entry
+
+def log_seconds(timestamp):
+    """Seconds since the epoch for an entry timestamp (2025-02-12T11:53:15Z)"""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+class ConnectionState:
+    """Username/password seen per connection, bounded in size and age
+
+    Connections are kept in least-recently-active order. Age is measured
+    in log time, so re-parsing an old log evicts exactly as it did live.
+    """
+
+    def __init__(self, max_connections=CONN_STATE_MAX, ttl=CONN_STATE_TTL):
+        self.max_connections = max_connections
+        self.ttl = ttl
+        self.connections = OrderedDict()  # conn_id -> [last_seen, credentials]
+        self.stats = Counter()
+        self.clock_timestamp = None
+        self.clock = 0.0
+
+    def _now(self, timestamp):
+        """Log time of an entry, or None if its timestamp is unreadable"""
+        # Consecutive lines mostly share a timestamp
+        if timestamp != self.clock_timestamp:
+            try:
+                clock = log_seconds(timestamp)
+            except ValueError:
+                return None
+            self.clock_timestamp = timestamp
+            self.clock = clock
+        return self.clock
+
+    def _expire(self, now):
+        while self.connections:
+            conn_id, (last_seen, _) = next(iter(self.connections.items()))
+            if now - last_seen <= self.ttl:
+                break
+            del self.connections[conn_id]
+            self.stats['evicted_idle'] += 1
+
+    def credentials(self, conn_id, timestamp):
+        """Return the credentials dict of a connection, marking it active"""
+        now = self._now(timestamp)
+        if now is None:
+            # Keep the last readable log time and expire nothing
+            now = self.clock
+        else:
+            self._expire(now)
+        state = self.connections.get(conn_id)
+        if state is None:
+            state = self.connections[conn_id] = [now, {}]
+            self.stats['tracked'] += 1
+            if len(self.connections) > self.max_connections:
+                self.connections.popitem(last=False)
+                self.stats['evicted_lru'] += 1
+            self.stats['peak'] = max(self.stats['peak'], len(self.connections))
+        else:
+            state[0] = now
+            self.connections.move_to_end(conn_id)
+        return state[1]
+
+    def close(self, conn_id):
+        if self.connections.pop(conn_id, None) is not None:
+            self.stats['evicted_closed'] += 1
+
+    def summary(self):
+        return (f"tracked={self.stats['tracked']} live={len(self.connections)} "
+                f"peak={self.stats['peak']} closed={self.stats['evicted_closed']} "
+                f"idle={self.stats['evicted_idle']} lru={self.stats['evicted_lru']}")
+
+def is_close(message):
+    # FTP close lines are typed ftp_activity, so match the message itself
+    lower = message.lower()
+    return 'close' in lower or 'disconnect' in lower
+
+def correlate(entries, state):
+    """Carry each connection's username/password onto its later entries
+
+    Entries must be in log order; the result depends only on that order.
+    """
+    for entry in entries:
+        # Track connections to correlate username/password
+        conn_id = entry.get('connection_id')
+        if conn_id:
+            credentials = state.credentials(conn_id, entry['timestamp'])
+            if 'username' in entry:
+                credentials['username'] = entry['username']
+            if 'password' in entry:
+                credentials['password'] = entry['password']
+
+            # Add correlated data
+            entry['username'] = credentials.get('username')
+            entry['password'] = credentials.get('password')
+
+        elif is_close(entry['raw_message']):
+            closed = CLOSED_CONNECTION.search(entry['raw_message'])
+            if closed:
+                state.close(closed.group(1))
+
+        yield entry
+
+def parse_lines(lines):
+    """Parse lines, skipping those that are not FTP or connection related"""
+    for line in lines:
+        entry = parse_dionaea_log_line(line)
+        if entry:
+            yield entry
+
+def chunk_ranges(log_file, chunks):
+    """Split a file into about `chunks` byte ranges that end on a newline"""
+    size = os.path.getsize(log_file)
+    if not size:
         return []
+    ranges = []
+    with open(log_file, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        for i in range(1, chunks + 1):
+            end = size if i == chunks else mm.find(b'\n', max(start, size * i // chunks)) + 1
+            if end <= 0:
+                end = size
+            if end > start:
+                ranges.append((start, end))
+                start = end
+            if start >= size:
+                break
+    return ranges
+
+def parse_chunk(task):
+    """Parse one byte range of the log (runs in a worker process)"""
+    log_file, start, end = task
+    with open(log_file, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Decoded like open(log_file, 'r', errors='ignore')
+        lines = io.TextIOWrapper(io.BytesIO(mm[start:end]), errors='ignore')
+        return list(parse_lines(lines))
+
+def parse_dionaea_logs(log_file=LOG_FILE, workers=1, state=None):
+    """Parse Dionaea logs, yielding JSON entries in log order"""
     
-    entries = []
-    connection_map = defaultdict(dict)
-    
-    print(f"Parsing {LOG_FILE}...")
+    if not os.path.exists(log_file):
+        print(f"Log file not found: {log_file}")
+        return
     
-    with open(LOG_FILE, 'r', errors='ignore') as f:
-        for line in f:
-            # Only process lines with relevant information
-            if any(keyword in line.lower() for keyword in ['ftp', 'connection', 'user', 'pass']):
-                entry = parse_dionaea_log_line(line)
-                if entry and entry['event_type'] != 'unknown':
-                    # Track connections to correlate username/password
-                    conn_id = entry.get('connection_id')
-                    if conn_id:
-                        if 'username' in entry:
-                            connection_map[conn_id]['username'] = entry['username']
-                        if 'password' in entry:
-                            connection_map[conn_id]['password'] = entry['password']
-                        
-                        # Add correlated data
-                        entry['username'] = connection_map[conn_id].get('username')
-                        entry['password'] = connection_map[conn_id].get('password')
-                    
-                    entries.append(entry)
+    print(f"Parsing {log_file}...")
+    if state is None:
+        state = ConnectionState()
     
-    print(f"Parsed {len(entries)} FTP-related log entries")
-    return entries
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        with open(log_file, 'r', errors='ignore') as f:
+            yield from correlate(parse_lines(f), state)
+    else:
+        # Backfill mode: chunks are byte ranges, so chunk order is log order
+        chunks = max(workers, os.path.getsize(log_file) // CHUNK_BYTES + 1)
+        tasks = [(log_file, start, end) for start, end in chunk_ranges(log_file, chunks)]
+        with Pool(workers) as pool:
+            parsed_chunks = pool.imap(parse_chunk, tasks)
+            yield from correlate(itertools.chain.from_iterable(parsed_chunks), state)
 
 def save_json_logs(entries):
-    """Save parsed entries as JSON (newline-delimited)"""
+    """Save parsed entries as JSON (newline-delimited) as they are produced
+
+    Entries go to a temporary file that replaces OUTPUT_FILE with an atomic
+    rename once complete, so readers never see a partial file.
+    """
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
     
-    with open(OUTPUT_FILE, 'w') as f:
-        for entry in entries:
-            f.write(json.dumps(entry) + '\n')
+    count = 0
+    tmp_path = f"{OUTPUT_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, OUTPUT_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
     
     print(f"Saved to {OUTPUT_FILE}")
+    return count
 
 if __name__ == "__main__":
-    entries = parse_dionaea_logs()
-    if entries:
-        save_json_logs(entries)
+    parser = argparse.ArgumentParser(description="Convert dionaea.log to NDJSON")
+    parser.add_argument("--log-file", default=LOG_FILE)
+    parser.add_argument("--workers", type=int, default=PARSE_WORKERS,
+                        help="parser processes for large logs (0 uses every core)")
+    args = parser.parse_args()
+
+    state = ConnectionState()
+    entries = parse_dionaea_logs(args.log_file, args.workers, state)
+    first = next(entries, None)
+    if first is not None:
+        sample = json.dumps(first, indent=2)
+        count = save_json_logs(itertools.chain([first], entries))
+        print(f"Parsed {count} FTP-related log entries")
+        print(f"Connection state: {state.summary()}")
         print(f"\nSample entry:")
-        print(json.dumps(entries[0], indent=2))
+        print(sample)
     else:
         print("No FTP entries found in logs")
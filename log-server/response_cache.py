@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+In-memory LRU cache of rendered log server responses
+
+Entries are keyed by the response ETag, which is derived from the request
+path, the parsed query and the identity (inode, size, mtime) of the indexed
+file, so a cached body can never outlive the data it was built from.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_BUDGET = int(os.environ.get('RESPONSE_CACHE_MB', '64')) * 1024 * 1024
+# Never let one huge response evict everything else
+MAX_ENTRY_SIZE = CACHE_BUDGET // 4
+
+
+def make_etag(snapshot, *parts):
+    """Build a strong ETag from a file index snapshot and request details"""
+    key = json.dumps([snapshot['inode'], snapshot['size'], snapshot['mtime_ns'],
+                      snapshot['generation'], parts], sort_keys=True, default=sorted)
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()[:24]
+
+
+def etag_matches(if_none_match, etag):
+    """Evaluate an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or any(
+        tag == etag or tag == 'W/' + etag for tag in candidates)
+
+
+class ResponseCache:
+    """Thread-safe LRU of response bodies bounded by total size in bytes"""
+
+    def __init__(self, budget=CACHE_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > MAX_ENTRY_SIZE or len(body) > self.budget:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.budget:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
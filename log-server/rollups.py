@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated rollup tables for the /stats endpoints
+
+A Rollup is maintained alongside each LogIndex and updated as new records
+are indexed, so dashboard counters never need the raw events:
+  buckets      - per-minute counts split by event_type
+  event_types  - total count per event_type
+  top          - value counts for src_ip, username, password, path, method
+  sketches     - per hour, a HyperLogLog and a HeavyHitters summary (see
+                 sketches.py) of src_ip, username, password and path, so
+                 distinct counts and top values over any range are
+                 answered by merging a few fixed-size summaries
+
+The web honeypot logs the client address as remote_addr; it is counted
+as src_ip so every log answers the same questions.
+
+Sketch accuracy is configured with SKETCH_DISTINCT_ERROR (relative
+standard error of distinct counts) and SKETCH_TOP_ERROR (most a top-N
+count can be low by, as a fraction of the records in range). Changing
+either rebuilds the rollups.
+"""
+import os
+import json
+import math
+from collections import Counter
+
+from sketches import HeavyHitters, HyperLogLog, hash64, hll_precision, top_capacity
+
+BUCKET_SECONDS = 60
+TOP_FIELDS = ('src_ip', 'username', 'password', 'path', 'method')
+SKETCH_FIELDS = ('src_ip', 'username', 'password', 'path')
+SKETCH_BUCKET_SECONDS = 3600
+SKETCH_DAY_SECONDS = 86400
+SKETCH_DISTINCT_ERROR = float(os.environ.get('SKETCH_DISTINCT_ERROR', '0.02'))
+SKETCH_TOP_ERROR = float(os.environ.get('SKETCH_TOP_ERROR', '0.01'))
+HLL_PRECISION = hll_precision(SKETCH_DISTINCT_ERROR)
+TOP_KEYS = top_capacity(SKETCH_TOP_ERROR)
+
+
+def record_value(log_entry, field):
+    """Return the rollup key for a field, or None if it is missing/empty"""
+    value = log_entry.get(field)
+    if field == 'src_ip' and not value:
+        value = log_entry.get('remote_addr')
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        value = json.dumps(value)
+    return value
+
+
+class BucketSketches:
+    """Distinct-count and top-value summaries of one time bucket"""
+    __slots__ = ('distinct', 'top')
+
+    def __init__(self):
+        self.distinct = {field: HyperLogLog(HLL_PRECISION) for field in SKETCH_FIELDS}
+        self.top = {field: HeavyHitters(TOP_KEYS) for field in SKETCH_FIELDS}
+
+    def merge(self, other):
+        for field in SKETCH_FIELDS:
+            self.distinct[field].merge(other.distinct[field])
+            self.top[field].merge(other.top[field])
+
+    def to_state(self):
+        return {field: [self.distinct[field].to_state(), self.top[field].to_state()]
+                for field in SKETCH_FIELDS}
+
+    @classmethod
+    def from_state(cls, state):
+        sketches = cls()
+        for field, (distinct, top) in state.items():
+            sketches.distinct[field] = HyperLogLog.from_state(HLL_PRECISION, distinct)
+            sketches.top[field] = HeavyHitters.from_state(TOP_KEYS, top)
+        return sketches
+
+
+def bucket_sketches(buckets, bucket):
+    sketches = buckets.get(bucket)
+    if sketches is None:
+        sketches = buckets[bucket] = BucketSketches()
+    return sketches
+
+
+class Rollup:
+    """Incrementally maintained counters for one log file"""
+
+    def __init__(self, with_sketches=True):
+        self.records = 0
+        self.buckets = {}
+        self.event_types = Counter()
+        self.top = {field: Counter() for field in TOP_FIELDS}
+        self.hour_sketches = {}
+        # Whole days merged from hour_sketches on demand, see day()
+        self.day_sketches = {}
+        self.dirty_days = set()
+        # Records without a timestamp only count towards all-time answers
+        self.untimed_sketches = BucketSketches() if with_sketches else None
+
+    def add(self, log_entry, ts):
+        """Account for one record with timestamp ts (epoch seconds or NaN)"""
+        self.records += 1
+        event_type = record_value(log_entry, 'event_type') or 'unknown'
+        self.event_types[event_type] += 1
+        sketches = self.untimed_sketches
+        if not math.isnan(ts):
+            bucket = int(ts // BUCKET_SECONDS) * BUCKET_SECONDS
+            counts = self.buckets.get(bucket)
+            if counts is None:
+                counts = self.buckets[bucket] = Counter()
+            counts[event_type] += 1
+            if sketches is not None:
+                sketches = bucket_sketches(
+                    self.hour_sketches,
+                    int(ts // SKETCH_BUCKET_SECONDS) * SKETCH_BUCKET_SECONDS)
+                self.dirty_days.add(int(ts // SKETCH_DAY_SECONDS) * SKETCH_DAY_SECONDS)
+        for field, counter in self.top.items():
+            value = record_value(log_entry, field)
+            if value is not None:
+                counter[value] += 1
+                if sketches is not None and field in SKETCH_FIELDS:
+                    sketches.distinct[field].add_hash(hash64(value))
+                    sketches.top[field].add(value)
+
+    def merge(self, other):
+        """Add the counts of another rollup (e.g. of a closed segment)"""
+        self.records += other.records
+        self.event_types.update(other.event_types)
+        for bucket, counts in other.buckets.items():
+            mine = self.buckets.get(bucket)
+            if mine is None:
+                mine = self.buckets[bucket] = Counter()
+            mine.update(counts)
+        for field, counter in other.top.items():
+            self.top[field].update(counter)
+        # A rollup built with_sketches=False has none to give or to take
+        if self.untimed_sketches is None or other.untimed_sketches is None:
+            return
+        for hour, sketches in other.hour_sketches.items():
+            bucket_sketches(self.hour_sketches, hour).merge(sketches)
+            self.dirty_days.add(hour // SKETCH_DAY_SECONDS * SKETCH_DAY_SECONDS)
+        self.untimed_sketches.merge(other.untimed_sketches)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _bucket_range(self, start_ts, end_ts):
+        for bucket, counts in self.buckets.items():
+            if start_ts is not None and bucket + BUCKET_SECONDS <= start_ts:
+                continue
+            if end_ts is not None and bucket > end_ts:
+                continue
+            yield bucket, counts
+
+    def timeseries(self, interval, start_ts=None, end_ts=None):
+        """Return sorted [(bucket_start, count)] at the given interval"""
+        interval = max(BUCKET_SECONDS, interval // BUCKET_SECONDS * BUCKET_SECONDS)
+        totals = Counter()
+        for bucket, counts in self._bucket_range(start_ts, end_ts):
+            totals[bucket // interval * interval] += sum(counts.values())
+        return sorted(totals.items())
+
+    def event_type_counts(self, start_ts=None, end_ts=None):
+        if start_ts is None and end_ts is None:
+            return Counter(self.event_types)
+        totals = Counter()
+        for _, counts in self._bucket_range(start_ts, end_ts):
+            totals.update(counts)
+        return totals
+
+    def total(self, start_ts=None, end_ts=None):
+        if start_ts is None and end_ts is None:
+            return self.records
+        return sum(self.event_type_counts(start_ts, end_ts).values())
+
+    def day(self, day):
+        """Sketches of a whole day, merged from its hours once they change"""
+        sketches = self.day_sketches.get(day)
+        if sketches is None or day in self.dirty_days:
+            sketches = self.day_sketches[day] = BucketSketches()
+            for hour in range(day, day + SKETCH_DAY_SECONDS, SKETCH_BUCKET_SECONDS):
+                if hour in self.hour_sketches:
+                    sketches.merge(self.hour_sketches[hour])
+            self.dirty_days.discard(day)
+        return sketches
+
+    def sketch_range(self, start_ts=None, end_ts=None):
+        """Yield the BucketSketches covering a time range
+
+        Hours overlapping the range are included whole, as minute buckets
+        are for the counters. Days whose every hour is included are merged
+        as one, so a 30-day range merges about 30 summaries rather than 720.
+        """
+        days = sorted({hour // SKETCH_DAY_SECONDS * SKETCH_DAY_SECONDS
+                       for hour in self.hour_sketches})
+        if start_ts is None and end_ts is None:
+            if self.untimed_sketches is not None:
+                yield self.untimed_sketches
+            for day in days:
+                yield self.day(day)
+            return
+        first = (-math.inf if start_ts is None else
+                 start_ts // SKETCH_BUCKET_SECONDS * SKETCH_BUCKET_SECONDS)
+        last = math.inf if end_ts is None else end_ts
+        last_hour = SKETCH_DAY_SECONDS - SKETCH_BUCKET_SECONDS
+        for day in days:
+            if day + last_hour < first or day > last:
+                continue
+            if day >= first and day + last_hour <= last:
+                yield self.day(day)
+                continue
+            for hour in range(day, day + SKETCH_DAY_SECONDS, SKETCH_BUCKET_SECONDS):
+                if first <= hour <= last and hour in self.hour_sketches:
+                    yield self.hour_sketches[hour]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        state = {
+            'records': self.records,
+            'buckets': {str(b): counts for b, counts in self.buckets.items()},
+            'event_types': self.event_types,
+            'top': self.top,
+            'sketches': {
+                'precision': HLL_PRECISION,
+                'top_keys': TOP_KEYS,
+                'hours': {str(b): s.to_state() for b, s in self.hour_sketches.items()},
+                'untimed': self.untimed_sketches.to_state(),
+            },
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        rollup = cls()
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return rollup
+        sketches = state.get('sketches')
+        if (sketches is None or sketches['precision'] != HLL_PRECISION
+                or sketches['top_keys'] != TOP_KEYS):
+            # Saved before sketches or with other error bounds: start over
+            return rollup
+        rollup.records = state['records']
+        rollup.buckets = {int(b): Counter(counts)
+                          for b, counts in state['buckets'].items()}
+        rollup.event_types = Counter(state['event_types'])
+        for field in TOP_FIELDS:
+            rollup.top[field] = Counter(state['top'].get(field, {}))
+        rollup.hour_sketches = {int(b): BucketSketches.from_state(s)
+                                for b, s in sketches['hours'].items()}
+        rollup.untimed_sketches = BucketSketches.from_state(sketches['untimed'])
+        return rollup
+
+
+def merged_distinct(rollups, field, start_ts=None, end_ts=None):
+    """One HyperLogLog of a field over a time range of several rollups"""
+    distinct = HyperLogLog(HLL_PRECISION)
+    for rollup in rollups:
+        for sketches in rollup.sketch_range(start_ts, end_ts):
+            distinct.merge(sketches.distinct[field])
+    return distinct
+
+
+def merged_top(rollups, field, start_ts=None, end_ts=None):
+    """One HeavyHitters of a field over a time range of several rollups"""
+    top = HeavyHitters(TOP_KEYS)
+    for rollup in rollups:
+        for sketches in rollup.sketch_range(start_ts, end_ts):
+            top.merge(sketches.top[field])
+    return top
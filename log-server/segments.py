@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Closed log segments as seen by the log server
+
+The honeypots rotate their logs into compressed segments (see
+segmented_log.py). The live file keeps being served from its LogIndex;
+closed segments are listed by the manifest and are only decompressed when
+a request's time range overlaps their min/max timestamps.
+
+Closed segments never change, so each one's Rollup is computed once and
+persisted next to the live file's index. The rollups of all compressed
+segments are merged into one "history" rollup kept in memory.
+
+Record ids are seq * SEGMENT_ID_STRIDE + line number, with the live file
+numbered as the next segment, so ids stay unique and increasing across
+rotations.
+"""
+import os
+import json
+import threading
+import time
+
+from log_index import STATE_DIR
+from rollups import Rollup
+from segmented_log import open_segment, parse_timestamp, read_manifest
+
+SEGMENT_ID_STRIDE = 10 ** 9
+
+
+def overlaps(segment, start_ts, end_ts):
+    """Could the segment hold records inside [start_ts, end_ts]?"""
+    if not segment['compressed']:
+        # Statistics are only recorded once a segment is compressed
+        return True
+    if segment['min_ts'] is None:
+        # Records without timestamps never match a time range
+        return start_ts is None and end_ts is None
+    if start_ts is not None and segment['max_ts'] < start_ts:
+        return False
+    if end_ts is not None and segment['min_ts'] > end_ts:
+        return False
+    return True
+
+
+def in_range(log_entry, start_ts, end_ts):
+    if start_ts is None and end_ts is None:
+        return True
+    ts = parse_timestamp(log_entry.get('timestamp'))
+    if start_ts is not None and not ts >= start_ts:
+        return False
+    if end_ts is not None and not ts <= end_ts:
+        return False
+    return True
+
+
+def union_keys(manifest, snapshot):
+    """Union of the keys of all closed segments and the live file"""
+    keys = {}
+    for segment in manifest['segments'] if manifest else ():
+        for key in segment.get('keys', ()):
+            keys.setdefault(key)
+    for key in snapshot['keys']:
+        keys.setdefault(key)
+    return list(keys)
+
+
+def live_id_base(manifest):
+    return manifest['next_seq'] * SEGMENT_ID_STRIDE if manifest else 0
+
+
+def manifest_identity(manifest):
+    """What a cached response depends on besides the live file"""
+    if not manifest:
+        return None
+    return [segment['file'] for segment in manifest['segments']]
+
+
+class SegmentStore:
+    """Closed segments of one log file and their rollups"""
+
+    def __init__(self, file_path, rel_path):
+        self.file_path = file_path
+        name = rel_path.replace('/', '__') + '.segments'
+        self.dir = os.path.join(STATE_DIR, name)
+        self.history = Rollup()
+        self.history_files = ()
+
+    def view(self, index):
+        """Refresh the index and return (snapshot, manifest) for one live file
+
+        A rotation between reading the manifest and refreshing the index
+        would lose or duplicate a segment, so retry until the manifest
+        describes the live file that was indexed.
+        """
+        for _ in range(5):
+            manifest = read_manifest(self.file_path)
+            snapshot = index.refresh()
+            if manifest is None or manifest['live_inode'] == snapshot['inode']:
+                break
+            time.sleep(0.05)
+        return snapshot, manifest
+
+    def iter_entries(self, manifest, start_ts=None, end_ts=None):
+        """Yield (id, log_entry) from the closed segments overlapping a range"""
+        if not manifest:
+            return
+        for segment in manifest['segments']:
+            if not overlaps(segment, start_ts, end_ts):
+                continue
+            base = segment['seq'] * SEGMENT_ID_STRIDE
+            with open_segment(self.file_path, segment) as f:
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        log_entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(log_entry, dict) and in_range(log_entry, start_ts, end_ts):
+                        yield base + line_no, log_entry
+
+    # ------------------------------------------------------------------
+    # Rollups (callers hold the log's index lock)
+    # ------------------------------------------------------------------
+
+    def _scan_rollup(self, segment):
+        rollup = Rollup()
+        with open_segment(self.file_path, segment) as f:
+            for line in f:
+                try:
+                    log_entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(log_entry, dict):
+                    rollup.add(log_entry, parse_timestamp(log_entry.get('timestamp')))
+        return rollup
+
+    def _segment_rollup(self, segment):
+        path = os.path.join(self.dir, segment['file'] + '.rollup.json')
+        if os.path.exists(path):
+            rollup = Rollup.load(path)
+            # Otherwise it was saved by an older version and is rebuilt
+            if rollup.records == segment['records']:
+                return rollup
+        rollup = self._scan_rollup(segment)
+        os.makedirs(self.dir, exist_ok=True)
+        rollup.save(path)
+        return rollup
+
+    def rollups(self, manifest):
+        """Return rollups covering every closed segment in the manifest"""
+        if not manifest:
+            return []
+        compressed = [s for s in manifest['segments'] if s['compressed']]
+        files = tuple(s['file'] for s in compressed)
+        if files[:len(self.history_files)] != self.history_files:
+            # Old segments were deleted by retention
+            self.history, self.history_files = Rollup(), ()
+        for segment in compressed[len(self.history_files):]:
+            self.history.merge(self._segment_rollup(segment))
+        self.history_files = files
+        # Segments still being compressed are counted without caching
+        pending = [self._scan_rollup(s) for s in manifest['segments']
+                   if not s['compressed']]
+        return [self.history] + pending
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_segments(file_path, rel_path):
+    """Return the shared SegmentStore instance for a log file"""
+    with _stores_lock:
+        store = _stores.get(file_path)
+        if store is None:
+            store = _stores[file_path] = SegmentStore(file_path, rel_path)
+        return store
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Cross-honeypot attacker sessions, maintained while events are ingested
+
+Events of one src_ip belong to the same session when they are at most
+SESSION_GAP seconds apart, whichever honeypot they came from, so a session
+can start on SSH, continue on FTP and end on HTTP. Sessions are stored in
+the event store's sessions table with their time span and per-protocol
+counts; the events themselves are not copied, a timeline reads them back
+through the (src_ip, ts) index.
+
+The logs are ingested one after another, so events of an IP can arrive
+out of time order. An event that falls between two sessions and is within
+SESSION_GAP of both joins them into one; grouping therefore does not
+depend on arrival order.
+
+Only the last session touched per IP is kept in memory, in an LRU bounded
+by SESSION_CACHE IPs; everything else lives in SQLite.
+"""
+import os
+from collections import OrderedDict
+
+from event_schema import FIELDS
+
+SESSION_GAP = float(os.environ.get('SESSION_GAP', '1800'))
+SESSION_CACHE = int(os.environ.get('SESSION_CACHE', '50000'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id        INTEGER PRIMARY KEY,
+    src_ip    TEXT NOT NULL,
+    start_ts  REAL NOT NULL,
+    end_ts    REAL NOT NULL,
+    events    INTEGER NOT NULL,
+    logins    INTEGER NOT NULL,
+    commands  INTEGER NOT NULL,
+    protocols TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (src_ip, start_ts);
+CREATE INDEX IF NOT EXISTS idx_sessions_end ON sessions (src_ip, end_ts);
+"""
+
+SESSION_COLUMNS = ('id', 'src_ip', 'start_ts', 'end_ts', 'events', 'logins',
+                   'commands', 'protocols')
+
+
+def load_session(row):
+    session = dict(zip(SESSION_COLUMNS, row))
+    session['protocols'] = set(filter(None, session['protocols'].split(',')))
+    return session
+
+
+class SessionTracker:
+    """Groups ingested events into per-IP sessions"""
+
+    def __init__(self, gap=SESSION_GAP, max_cached=SESSION_CACHE):
+        self.gap = gap
+        self.max_cached = max_cached
+        # src_ip -> session dict with the bounds of its neighbours
+        self.cache = OrderedDict()
+        self.dirty = set()
+
+    def add(self, db, src_ip, ts, protocol, action):
+        """Account for one event; events without an IP or time are ignored"""
+        if src_ip is None or ts is None:
+            return
+        session = self.cache.get(src_ip)
+        if session is None or not self._fits(session, ts):
+            session = self._locate(db, src_ip, ts)
+        else:
+            self.cache.move_to_end(src_ip)
+        session['start_ts'] = min(session['start_ts'], ts)
+        session['end_ts'] = max(session['end_ts'], ts)
+        session['events'] += 1
+        if action == 'login':
+            session['logins'] += 1
+        elif action == 'command':
+            session['commands'] += 1
+        if protocol:
+            session['protocols'].add(protocol)
+        self.dirty.add(src_ip)
+
+    def _fits(self, session, ts):
+        """Can ts join the cached session without touching its neighbours?"""
+        return (session['start_ts'] - self.gap <= ts <= session['end_ts'] + self.gap
+                and session['prev_end'] < ts - self.gap
+                and ts + self.gap < session['next_start'])
+
+    def _locate(self, db, src_ip, ts):
+        """Find (merging if ts bridges them) or start the session for ts"""
+        if src_ip in self.cache:
+            self._write(db, self.cache.pop(src_ip))
+            self.dirty.discard(src_ip)
+        rows = db.execute(
+            'SELECT %s FROM sessions WHERE src_ip = ? AND end_ts >= ? AND start_ts <= ?'
+            ' ORDER BY start_ts' % ', '.join(SESSION_COLUMNS),
+            (src_ip, ts - self.gap, ts + self.gap)).fetchall()
+        if rows:
+            session = load_session(rows[0])
+            for row in rows[1:]:
+                other = load_session(row)
+                session['end_ts'] = max(session['end_ts'], other['end_ts'])
+                for field in ('events', 'logins', 'commands'):
+                    session[field] += other[field]
+                session['protocols'] |= other['protocols']
+                db.execute('DELETE FROM sessions WHERE id = ?', (other['id'],))
+        else:
+            session = {'id': None, 'src_ip': src_ip, 'start_ts': ts, 'end_ts': ts,
+                       'events': 0, 'logins': 0, 'commands': 0, 'protocols': set()}
+        start = min(session['start_ts'], ts)
+        end = max(session['end_ts'], ts)
+        prev_end = db.execute(
+            'SELECT MAX(end_ts) FROM sessions WHERE src_ip = ? AND end_ts < ?',
+            (src_ip, start - self.gap)).fetchone()[0]
+        next_start = db.execute(
+            'SELECT MIN(start_ts) FROM sessions WHERE src_ip = ? AND start_ts > ?',
+            (src_ip, end + self.gap)).fetchone()[0]
+        session['prev_end'] = float('-inf') if prev_end is None else prev_end
+        session['next_start'] = float('inf') if next_start is None else next_start
+
+        self.cache[src_ip] = session
+        while len(self.cache) > self.max_cached:
+            ip, evicted = self.cache.popitem(last=False)
+            if ip in self.dirty:
+                self._write(db, evicted)
+                self.dirty.discard(ip)
+        return session
+
+    def _write(self, db, session):
+        values = (session['src_ip'], session['start_ts'], session['end_ts'],
+                  session['events'], session['logins'], session['commands'],
+                  ','.join(sorted(session['protocols'])))
+        if session['id'] is None:
+            session['id'] = db.execute(
+                'INSERT INTO sessions (src_ip, start_ts, end_ts, events, logins,'
+                ' commands, protocols) VALUES (?, ?, ?, ?, ?, ?, ?)', values).lastrowid
+        else:
+            db.execute(
+                'UPDATE sessions SET src_ip = ?, start_ts = ?, end_ts = ?, events = ?,'
+                ' logins = ?, commands = ?, protocols = ? WHERE id = ?',
+                values + (session['id'],))
+
+    def flush(self, db):
+        """Write changed sessions (call inside the ingest transaction)"""
+        for src_ip in self.dirty:
+            self._write(db, self.cache[src_ip])
+        self.dirty.clear()
+
+    def reset(self):
+        """Forget cached sessions, e.g. after a rolled back transaction"""
+        self.cache.clear()
+        self.dirty.clear()
+
+    def rebuild(self, db):
+        """Regroup every stored event, e.g. after a log was re-ingested"""
+        self.reset()
+        db.execute('DELETE FROM sessions')
+        rows = db.execute('SELECT src_ip, ts, protocol, action FROM events'
+                          ' WHERE src_ip IS NOT NULL AND ts IS NOT NULL'
+                          ' ORDER BY src_ip, ts')
+        for src_ip, ts, protocol, action in rows:
+            self.add(db, src_ip, ts, protocol, action)
+        self.flush(db)
+
+
+def timeline(db, src_ip, start_ts=None, end_ts=None, fields=None):
+    """Sessions of one IP with their events, oldest first
+
+    Reads only that IP's sessions and events, both through indexes.
+    """
+    sql = ' WHERE src_ip = ?'
+    params = [src_ip]
+    if start_ts is not None:
+        sql += ' AND ts >= ?'
+        params.append(start_ts)
+    if end_ts is not None:
+        sql += ' AND ts <= ?'
+        params.append(end_ts)
+    session_sql = ('SELECT %s FROM sessions WHERE src_ip = ?'
+                   ' AND end_ts >= ? AND start_ts <= ? ORDER BY start_ts'
+                   % ', '.join(SESSION_COLUMNS))
+    sessions = [load_session(row) for row in db.execute(
+        session_sql, (src_ip, float('-inf') if start_ts is None else start_ts,
+                      float('inf') if end_ts is None else end_ts))]
+    for session in sessions:
+        session['protocols'] = sorted(session['protocols'])
+        session['duration'] = session['end_ts'] - session['start_ts']
+        session['timeline'] = []
+
+    columns = ('source', 'record_id') + FIELDS
+    position = 0
+    events = 0
+    for row in db.execute('SELECT %s FROM events' % ', '.join(columns) + sql
+                          + ' AND ts IS NOT NULL ORDER BY ts, source, record_id', params):
+        event = dict(zip(columns, row))
+        while position < len(sessions) and sessions[position]['end_ts'] < event['ts']:
+            position += 1
+        if position == len(sessions):
+            break
+        if event['ts'] < sessions[position]['start_ts']:
+            # Ingested after the sessions were read
+            continue
+        if fields:
+            event = {field: event.get(field) for field in fields}
+        sessions[position]['timeline'].append(event)
+        events += 1
+    return {'src_ip': src_ip, 'events': events, 'sessions': sessions}
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Honeypot log statistics in one pass per file
+
+Reads every honeypot log once, including its rotated segments (see
+common/segmented_log.py), and counts top IPs, usernames, passwords, paths,
+user agents and event types at the same time. This replaces the jq | sort |
+uniq -c pipelines of analyze-logs.sh, which re-read each log once per
+statistic and sorted whole columns.
+
+Counts are exact until a field has more than --max-keys distinct values;
+from then on that field keeps a Misra-Gries summary (common/sketches.py)
+of at most 2x --max-keys values, so memory stays bounded on huge logs. Every reported
+count is then a lower bound, low by at most the "error" printed with it,
+and any value missing from the list occurred at most that many times.
+
+Usage:
+  python3 scripts/analyze-logs.py                 # report on ./logs
+  python3 scripts/analyze-logs.py --workers 4     # read files in parallel
+  python3 scripts/analyze-logs.py --json > stats.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+
+from segmented_log import open_segment, read_manifest  # noqa: E402
+from sketches import HeavyHitters  # noqa: E402
+
+# Log path -> (report title, unit, fields to count with their headings)
+LOGS = {
+    'ssh-honeypot/ssh_honeypot.json': ('🔐 SSH Honeypot', 'attempts', [
+        ('src_ip', 'Top attacking IPs'),
+        ('username', 'Most used usernames'),
+        ('password', 'Most used passwords'),
+        ('event_type', 'Event types'),
+    ]),
+    'web-honeypot/honeypot.json': ('🕸️  Web Honeypot', 'requests', [
+        ('path', 'Top paths requested'),
+        ('remote_addr', 'Top attacking IPs'),
+        ('user_agent', 'Top User Agents'),
+        ('method', 'Methods'),
+    ]),
+    'dionaea/ftp_parsed.json': ('📁 FTP Honeypot (parsed)', 'events', [
+        ('src_ip', 'Top attacking IPs'),
+        ('username', 'Most used usernames'),
+        ('password', 'Most used passwords'),
+        ('command', 'Top FTP commands'),
+        ('event_type', 'Event types'),
+    ]),
+}
+DEFAULT_MAX_KEYS = 100000
+
+
+def log_files(log_path):
+    """The closed segments of a log, oldest first, then its live file"""
+    manifest = read_manifest(log_path)
+    files = [(log_path, segment) for segment in manifest['segments']] if manifest else []
+    if os.path.exists(log_path):
+        files.append((log_path, None))
+    return files
+
+
+def analyze_file(task):
+    """Count the fields of one log file (a segment or the live file)"""
+    name, log_path, segment, max_keys = task
+    fields = [field for field, _ in LOGS[name][2]]
+    counters = {field: HeavyHitters(max_keys) for field in fields}
+    adders = [(field, counters[field].add) for field in fields]
+    total = invalid = 0
+    try:
+        f = open_segment(log_path, segment) if segment else open(log_path, 'rb')
+    except FileNotFoundError:
+        # Compressed or removed by retention since the manifest was read
+        return name, 0, 0, counters
+    with f:
+        for line in f:
+            try:
+                log_entry = json.loads(line)
+            except ValueError:
+                invalid += 1
+                continue
+            if not isinstance(log_entry, dict):
+                invalid += 1
+                continue
+            total += 1
+            for field, add in adders:
+                value = log_entry.get(field)
+                # Same as jq's select(.field): skip missing, null and empty
+                if value is None or value == '' or value is False:
+                    continue
+                add(value if isinstance(value, str) else json.dumps(value))
+    return name, total, invalid, counters
+
+
+def analyze(log_dir, workers=1, max_keys=DEFAULT_MAX_KEYS):
+    """Statistics of every log under log_dir, keyed by log name"""
+    tasks = [(name, log_path, segment, max_keys) for name in LOGS
+             for log_path, segment in log_files(os.path.join(log_dir, name))]
+    results = {}
+    if workers > 1 and len(tasks) > 1:
+        with Pool(min(workers, len(tasks))) as pool:
+            # In task order, so approximate counts do not depend on timing
+            for part in pool.imap(analyze_file, tasks):
+                merge_result(results, part)
+    else:
+        for task in tasks:
+            merge_result(results, analyze_file(task))
+    return results
+
+
+def merge_result(results, part):
+    name, total, invalid, counters = part
+    result = results.get(name)
+    if result is None:
+        results[name] = {'files': 1, 'total': total, 'invalid': invalid,
+                         'counters': counters}
+        return
+    result['files'] += 1
+    result['total'] += total
+    result['invalid'] += invalid
+    for field, counter in counters.items():
+        result['counters'][field].merge(counter)
+
+
+def to_json(results, n):
+    report = {}
+    for name in LOGS:
+        result = results.get(name)
+        if result is None:
+            continue
+        report[name] = {
+            'files': result['files'],
+            'total': result['total'],
+            'invalid': result['invalid'],
+            'top': {field: {'error': counter.error,
+                            'values': [{'value': value, 'count': count}
+                                       for value, count in counter.top(n)]}
+                    for field, counter in result['counters'].items()},
+        }
+    return report
+
+
+def print_report(results, n, elapsed):
+    print("📊 STATISTICS")
+    print("-------------")
+    print()
+    for name, (title, unit, fields) in LOGS.items():
+        print(f"{title}:")
+        result = results.get(name)
+        if result is None:
+            print("   No logs found yet")
+            print()
+            continue
+        files = f" in {result['files']} files" if result['files'] > 1 else ''
+        print(f"   Total events: {result['total']}{files}")
+        if result['invalid']:
+            print(f"   Unparseable lines: {result['invalid']}")
+        for field, heading in fields:
+            counter = result['counters'][field]
+            top = counter.top(n)
+            if not top:
+                continue
+            error = f" (approximate, counts may be low by up to {counter.error})" \
+                if counter.error else ''
+            print(f"   {heading}:{error}")
+            for value, count in top:
+                print(f"      {value[:60]}: {count} {unit}")
+        print()
+    print(f"⏱️  Analyzed in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Honeypot log statistics')
+    parser.add_argument('log_dir', nargs='?', default='logs')
+    parser.add_argument('--top', type=int, default=5, help='values per field (default 5)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes reading files in parallel (default 1)')
+    parser.add_argument('--max-keys', type=int, default=DEFAULT_MAX_KEYS,
+                        help='distinct values per field counted exactly '
+                             f'(default {DEFAULT_MAX_KEYS})')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a report')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.log_dir):
+        print(f"❌ Logs directory not found: {args.log_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    started = time.time()
+    results = analyze(args.log_dir, args.workers, args.max_keys)
+    if args.json:
+        json.dump(to_json(results, args.top), sys.stdout, indent=2)
+        print()
+    else:
+        print_report(results, args.top, time.time() - started)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,47 +12,10 @@ if [ ! -d "logs" ]; then
     exit 1
 fi
 
-# Helper function to check if jq is installed
-check_jq() {
-    if ! command -v jq &> /dev/null; then
-        echo "⚠️  jq is not installed. Some features will be limited."
-        echo "   Install with: sudo apt install jq"
-        return 1
-    fi
-    return 0
-}
-
-HAS_JQ=$(check_jq && echo "yes" || echo "no")
-
-echo "📊 STATISTICS"
-echo "-------------"
-echo ""
-
-# SSH Honeypot statistics
-if [ -f "logs/ssh-honeypot/ssh_honeypot.json" ]; then
-    echo "🔐 SSH Honeypot:"
-    TOTAL_EVENTS=$(wc -l < logs/ssh-honeypot/ssh_honeypot.json 2>/dev/null || echo "0")
-    echo "   Total events: $TOTAL_EVENTS"
-    
-    if [ "$HAS_JQ" = "yes" ] && [ $TOTAL_EVENTS -gt 0 ]; then
-        echo "   Top attacking IPs:"
-        cat logs/ssh-honeypot/ssh_honeypot.json | jq -r '.src_ip // empty' | sort | uniq -c | sort -rn | head -5 | while read count ip; do
-            echo "      $ip: $count attempts"
-        done
-        
-        echo "   Most used usernames:"
-        cat logs/ssh-honeypot/ssh_honeypot.json | jq -r 'select(.username) | .username' | sort | uniq -c | sort -rn | head -5 | while read count user; do
-            echo "      $user: $count attempts"
-        done
-        
-        echo "   Most used passwords:"
-        cat logs/ssh-honeypot/ssh_honeypot.json | jq -r 'select(.password) | .password' | sort | uniq -c | sort -rn | head -5 | while read count pass; do
-            echo "      $pass: $count attempts"
-        done
-    fi
-else
-    echo "🔐 SSH Honeypot:"
-    echo "   No logs found yet"
+# SSH, web and parsed FTP statistics, one pass over each log
+# (extra arguments such as --workers 4 or --top 10 are passed through)
+if ! python3 "$(dirname "$0")/analyze-logs.py" logs "$@"; then
+    echo "⚠️  python3 is required for the log statistics"
 fi
 echo ""
 
@@ -86,35 +49,6 @@ else
 fi
 echo ""
 
-# Web Honeypot statistics
-if [ -f "logs/web-honeypot/honeypot.json" ]; then
-    echo "🕸️  Web Honeypot:"
-    TOTAL_REQUESTS=$(wc -l < logs/web-honeypot/honeypot.json 2>/dev/null || echo "0")
-    echo "   Total requests: $TOTAL_REQUESTS"
-    
-    if [ "$HAS_JQ" = "yes" ] && [ $TOTAL_REQUESTS -gt 0 ]; then
-        echo "   Top paths requested:"
-        cat logs/web-honeypot/honeypot.json | jq -r '.path // empty' | sort | uniq -c | sort -rn | head -5 | while read count path; do
-            echo "      $path: $count requests"
-        done
-        
-        echo "   Top attacking IPs:"
-        cat logs/web-honeypot/honeypot.json | jq -r '.remote_addr // empty' | sort | uniq -c | sort -rn | head -5 | while read count ip; do
-            echo "      $ip: $count requests"
-        done
-        
-        echo "   Top User Agents:"
-        cat logs/web-honeypot/honeypot.json | jq -r '.user_agent // empty' | sort | uniq -c | sort -rn | head -3 | while read count agent; do
-            agent_short=$(echo "$agent" | cut -c1-60)
-            echo "      $agent_short: $count requests"
-        done
-    fi
-else
-    echo "🕸️  Web Honeypot:"
-    echo "   No logs found yet"
-fi
-echo ""
-
 # Overall statistics
 echo "📈 OVERALL STATISTICS"
 echo "--------------------"
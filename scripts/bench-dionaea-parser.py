@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Dionaea line parser benchmark
+
+Generates a synthetic dionaea.log and measures lines/second of both FTP
+parsers before (the per-line re.search versions they replaced, kept below)
+and after the shared single-pass classifier (common/dionaea_classifier.py).
+Events that differ between the old and new versions are counted.
+
+Usage:
+  # ~1 GB of synthetic log lines
+  python3 scripts/bench-dionaea-parser.py generate --out bench-logs/dionaea.log --size-gb 1
+  python3 scripts/bench-dionaea-parser.py run --log bench-logs/dionaea.log
+"""
+import argparse
+import importlib.util
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'log-server')]
+
+import parse_dionaea  # noqa: E402
+
+spec = importlib.util.spec_from_file_location(
+    'parse_dionaea_logs', os.path.join(ROOT, 'scripts', 'parse-dionaea-logs.py'))
+parse_dionaea_logs = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(parse_dionaea_logs)
+
+USERNAMES = ['anonymous', 'admin', 'root', 'ftp', 'test', 'user', 'backup']
+PASSWORDS = ['123456', 'password', 'anonymous@', 'admin', 'ftp', 'qwerty']
+
+# Share of each line kind in the synthetic log (most lines are noise)
+LINE_KINDS = [
+    ('noise', 55),
+    ('accept', 8),
+    ('close', 8),
+    ('user', 8),
+    ('pass', 8),
+    ('command', 8),
+    ('other_ftp', 5),
+]
+
+
+def synthetic_line(ts, con, remote_ip, remote_port):
+    stamp = ts.strftime('%m%d%Y %H:%M:%S')
+    kind = random.choices([k for k, _ in LINE_KINDS], [w for _, w in LINE_KINDS])[0]
+    if kind == 'noise':
+        return random.choice([
+            f"[{stamp}] dionaea dionaea.c:812-debug: signal handler set up\n",
+            f"[{stamp}] incident incident.c:365-debug: incident {con} dionaea.module.python.ftp.login\n",
+            f"[{stamp}] python module.c:778-debug: traceable_ihandler_cb incident {con}\n",
+            f"[{stamp}] pcap pcap.c:190-debug: 0 packets received\n",
+        ])
+    if kind == 'accept':
+        return (f"[{stamp}] connection connection.c:4456-message: connection {con} "
+                f"accept/tcp/ftp 172.25.0.2 21 <-> {remote_ip} {remote_port} state: none->established\n")
+    if kind == 'close':
+        return (f"[{stamp}] connection connection.c:1801-debug: connection {con} "
+                f"close/tcp/ftp 172.25.0.2 21 <-> {remote_ip} {remote_port}\n")
+    if kind == 'user':
+        return f"[{stamp}] ftp /dionaea/ftp.py:214-debug: con {con} processing line 'b'USER {random.choice(USERNAMES)}\\r\\n''\n"
+    if kind == 'pass':
+        return f"[{stamp}] ftp /dionaea/ftp.py:214-debug: con {con} processing line 'b'PASS {random.choice(PASSWORDS)}\\r\\n''\n"
+    if kind == 'command':
+        cmd = random.choice(['LIST', 'RETR file.txt', 'STOR x.sh', 'DELE a', 'MKD tmp'])
+        return f"[{stamp}] ftp /dionaea/ftp.py:214-debug: con {con} processing line 'b'{cmd}\\r\\n''\n"
+    return f"[{stamp}] ftp /dionaea/ftp.py:310-debug: con {con} sent 226 Transfer complete\n"
+
+
+def generate(args):
+    target = int(args.size_gb * 1024 ** 3)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    ts = datetime.utcnow() - timedelta(days=30)
+    written = 0
+    with open(args.out, 'w') as f:
+        while written < target:
+            con = f"0x{random.getrandbits(48):012x}"
+            remote_ip = f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+            remote_port = random.randint(1024, 65535)
+            lines = ''.join(synthetic_line(ts, con, remote_ip, remote_port)
+                            for _ in range(random.randint(5, 30)))
+            f.write(lines)
+            written += len(lines)
+            ts += timedelta(seconds=random.randint(0, 5))
+    print(f"Wrote {written / 1024 ** 2:.0f} MB to {args.out}")
+
+
+# ----------------------------------------------------------------------
+# Previous implementations, kept as the baseline
+# ----------------------------------------------------------------------
+
+def legacy_log_server_line(line):
+    if not any(keyword in line.lower() for keyword in ['ftp', 'connection', 'user', 'pass']):
+        return None
+    timestamp_match = re.search(r'\[(\d{8})\s+(\d{2}:\d{2}:\d{2})\]', line)
+    if not timestamp_match:
+        return None
+    date_str = timestamp_match.group(1)
+    timestamp = f"{date_str[4:8]}-{date_str[0:2]}-{date_str[2:4]}T{timestamp_match.group(2)}Z"
+    component_match = re.search(r'\]\s+(\w+)\s+', line)
+    component = component_match.group(1) if component_match else "unknown"
+    event_type = "unknown"
+    username = password = command = connection_id = src_ip = None
+    con_match = re.search(r'con\s+(0x[0-9a-f]+)', line)
+    if con_match:
+        connection_id = con_match.group(1)
+    ip_match = re.search(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', line)
+    if ip_match:
+        src_ip = ip_match.group(1)
+    if 'ftp' in line.lower():
+        event_type = "ftp_activity"
+        if 'USER' in line:
+            user_match = re.search(r"USER\s+([^\r\n'\"]+)", line)
+            if user_match:
+                username = user_match.group(1).strip()
+                event_type = "ftp_login_attempt"
+                command = "USER"
+        elif 'PASS' in line:
+            pass_match = re.search(r"PASS\s+([^\r\n'\"]+)", line)
+            if pass_match:
+                password = pass_match.group(1).strip()
+                event_type = "ftp_login_attempt"
+                command = "PASS"
+        elif any(cmd in line for cmd in ['LIST', 'RETR', 'STOR', 'DELE', 'MKD', 'RMD']):
+            for cmd in ['LIST', 'RETR', 'STOR', 'DELE', 'MKD', 'RMD', 'CWD', 'PWD', 'SYST', 'QUIT']:
+                if cmd in line:
+                    command = cmd
+                    event_type = "ftp_command"
+                    break
+    elif 'connection' in line.lower():
+        if 'accept' in line.lower():
+            event_type = "connection_accept"
+        elif 'close' in line.lower() or 'disconnect' in line.lower():
+            event_type = "connection_close"
+        else:
+            event_type = "connection"
+    entry = {"timestamp": timestamp, "event_type": event_type, "component": component,
+             "connection_id": connection_id, "src_ip": src_ip, "raw_message": line.strip()}
+    if username:
+        entry["username"] = username
+    if password:
+        entry["password"] = password
+    if command:
+        entry["command"] = command
+    return entry
+
+
+def legacy_scripts_line(line):
+    create_event = parse_dionaea_logs.create_event
+    conn_match = re.search(r'\[(\d{2}\w{3}\d{4} \d{2}:\d{2}:\d{2})\] connection\s+(\S+)\s+(\S+)\s+(\d+)\s+<->\s+(\S+)\s+(\d+)', line)
+    if conn_match and 'ftp' in line.lower():
+        # Never matches Dionaea's numeric dates; kept for timing only
+        return None
+    elif 'processing line' in line and ("b'USER" in line or "b'PASS" in line or "b'RETR" in line or "b'STOR" in line):
+        ts_match = re.search(r'\[(\d{2}\d{2}\d{4} \d{2}:\d{2}:\d{2})\]', line)
+        if ts_match:
+            timestamp = datetime.strptime(ts_match.group(1), '%m%d%Y %H:%M:%S').isoformat()
+            username = password = command = None
+            if "b'USER" in line:
+                command = 'USER'
+                user_match = re.search(r"b'USER\s+([^']+)'", line)
+                if user_match:
+                    username = user_match.group(1).strip()
+            elif "b'PASS" in line:
+                command = 'PASS'
+                pass_match = re.search(r"b'PASS\s+([^']+)'", line)
+                if pass_match:
+                    password = pass_match.group(1).strip()
+            elif "b'RETR" in line:
+                command = 'RETR'
+            elif "b'STOR" in line:
+                command = 'STOR'
+            if command:
+                return create_event(timestamp=timestamp, event_type='ftp_command',
+                                    command=command, username=username, password=password)
+    return None
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def measure(name, parse, lines):
+    start = time.perf_counter()
+    results = [parse(line) for line in lines]
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<8} {len(lines) / elapsed:>12,.0f} lines/s  "
+          f"({sum(1 for r in results if r)} events, {elapsed:.1f}s)")
+    return results, elapsed
+
+
+def compare(old, new, ignore=()):
+    """Count lines whose events differ (ignoring the given keys)"""
+    def strip(event):
+        return event and {k: v for k, v in event.items() if k not in ignore}
+    return sum(1 for a, b in zip(old, new) if strip(a) != strip(b))
+
+
+def run(args):
+    with open(args.log, 'r', errors='ignore') as f:
+        lines = f.readlines() if not args.limit_mb else f.readlines(int(args.limit_mb * 1024 ** 2))
+    print(f"{len(lines):,} lines from {args.log}\n")
+
+    print("log-server/parse_dionaea.py")
+    old, old_time = measure('before', legacy_log_server_line, lines)
+    new, new_time = measure('after', parse_dionaea.parse_dionaea_log_line, lines)
+    print(f"  speedup  {old_time / new_time:.2f}x, {compare(old, new)} differing lines\n")
+
+    print("scripts/parse-dionaea-logs.py")
+    old, old_time = measure('before', legacy_scripts_line, lines)
+    new, new_time = measure('after', parse_dionaea_logs.parse_line, lines)
+    # The old connection pattern never matched numeric dates, so only
+    # command events are compared
+    new_commands = [e if e and e['event_type'] == 'ftp_command' else None for e in new]
+    print(f"  speedup  {old_time / new_time:.2f}x, {compare(old, new_commands)} differing lines")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help='write a synthetic dionaea.log')
+    gen.add_argument('--out', default='bench-logs/dionaea.log')
+    gen.add_argument('--size-gb', type=float, default=1.0)
+
+    bench = sub.add_parser('run', help='measure parser throughput')
+    bench.add_argument('--log', default='bench-logs/dionaea.log')
+    bench.add_argument('--limit-mb', type=float, default=0,
+                       help='only read this much of the log (0 reads all of it)')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Log server latency benchmark
+
+Generates fixture logs and measures p50/p99 latency of concurrent panel
+requests against a running log server.
+
+Usage:
+  # Write ~2 GB of fixture logs per honeypot into ./bench-logs
+  python3 scripts/bench-log-server.py generate --dir bench-logs --size-gb 2
+
+  # Serve them (from log-server/) and fire 12 concurrent panel requests
+  STATE_DIR=/tmp/log-state PYTHONPATH=../common python3 -c "import convert_logs as c; \
+      c.LogHandler.LOG_DIR = '../bench-logs'; c.make_server().serve_forever()"
+  python3 scripts/bench-log-server.py run --url http://localhost:8080
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+LOGS = {
+    'ssh-honeypot/ssh_honeypot.json': 'ssh',
+    'web-honeypot/honeypot.json': 'web',
+    'dionaea/ftp_parsed.json': 'ftp',
+}
+
+# Four panels per dashboard, as generated by create-minimal-dashboards.py
+PANEL_QUERIES = [
+    'from=now-6h&to=now&fields=timestamp,count,event_type',
+    'from=now-6h&to=now&fields=username,count',
+    'from=now-6h&to=now&fields=username,count',
+    'from=now-6h&to=now&fields=timestamp,count,src_ip,username,password,event_type',
+]
+
+USERNAMES = ['root', 'admin', 'ubuntu', 'test', 'oracle', 'pi', 'user', 'guest']
+PASSWORDS = ['123456', 'password', 'admin', 'root', 'toor', 'qwerty', 'letmein']
+PATHS = ['/', '/.env', '/.git/config', '/wp-login.php', '/phpmyadmin/', '/admin']
+
+
+def fake_event(kind, ts):
+    ip = f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+    if kind == 'ssh':
+        return {
+            'timestamp': ts.isoformat(),
+            'event_type': random.choice(['connection', 'login_attempt', 'login_attempt', 'command']),
+            'src_ip': ip,
+            'username': random.choice(USERNAMES),
+            'password': random.choice(PASSWORDS),
+            'auth_method': 'password',
+        }
+    if kind == 'web':
+        return {
+            'timestamp': ts.isoformat(),
+            'remote_addr': ip,
+            'method': random.choice(['GET', 'GET', 'POST']),
+            'path': random.choice(PATHS),
+            'query_string': '',
+            'user_agent': 'Mozilla/5.0 (compatible; bench)',
+            'referer': '',
+            'headers': {'Host': 'web-app-03', 'User-Agent': 'Mozilla/5.0 (compatible; bench)'},
+            'form_data': {},
+            'json_data': None,
+            'cookies': {},
+        }
+    return {
+        'timestamp': ts.isoformat(),
+        'event_type': random.choice(['connection', 'ftp_command']),
+        'protocol': 'ftp',
+        'src_ip': ip,
+        'src_port': random.randint(1024, 65535),
+        'dst_port': 21,
+        'username': random.choice(USERNAMES),
+        'password': random.choice(PASSWORDS),
+        'command': random.choice(['USER', 'PASS', 'RETR']),
+        'message': None,
+        'count': 1,
+    }
+
+
+def generate(args):
+    target = int(args.size_gb * 1024 ** 3)
+    for rel_path, kind in LOGS.items():
+        path = os.path.join(args.dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Spread events over the last 30 days so now-6h selects a slice
+        ts = datetime.utcnow() - timedelta(days=30)
+        line_size = len(json.dumps(fake_event(kind, ts))) + 1
+        # Slightly long steps so the newest events reach the present
+        step_ms = max(1, int(1.1 * 30 * 86400 * 1000 / (target / line_size)))
+        written = 0
+        with open(path, 'w') as f:
+            while written < target:
+                line = json.dumps(fake_event(kind, ts)) + '\n'
+                f.write(line)
+                written += len(line)
+                ts += timedelta(milliseconds=random.randint(0, 2 * step_ms))
+        print(f"Wrote {written / 1024 ** 2:.0f} MB to {path}")
+
+
+def timed_get(url):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=600) as response:
+        size = len(response.read())
+    return time.perf_counter() - start, size
+
+
+def run(args):
+    urls = []
+    for rel_path in LOGS:
+        for query in PANEL_QUERIES:
+            urls.append(f"{args.url}/{rel_path}?{query}")
+    urls = urls[:args.concurrency]
+
+    latencies = []
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for round_no in range(1, args.rounds + 1):
+            results = list(pool.map(timed_get, urls))
+            latencies.extend(latency for latency, _ in results)
+            total_bytes += sum(size for _, size in results)
+            print(f"Round {round_no}: max {max(l for l, _ in results) * 1000:.0f} ms")
+
+    latencies.sort()
+    p99_index = min(len(latencies) - 1, int(len(latencies) * 0.99))
+    print(f"\n{len(latencies)} requests, {args.concurrency} concurrent")
+    print(f"p50: {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"p99: {latencies[p99_index] * 1000:.1f} ms")
+    print(f"bytes received: {total_bytes / 1024 ** 2:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help='write fixture logs')
+    gen.add_argument('--dir', default='bench-logs')
+    gen.add_argument('--size-gb', type=float, default=2.0,
+                     help='approximate size of each fixture log')
+
+    bench = sub.add_parser('run', help='measure panel request latency')
+    bench.add_argument('--url', default='http://localhost:8080')
+    bench.add_argument('--concurrency', type=int, default=12)
+    bench.add_argument('--rounds', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
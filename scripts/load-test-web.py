@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Web honeypot load test
+
+Hammers the routes served by web-honeypot/app.py from many keep-alive
+connections for a fixed time and reports requests/second and tail latency.
+Optional slow clients trickle header bytes the way slowloris scanners do,
+to check that they do not stall everyone else.
+
+Usage:
+  python3 scripts/load-test-web.py --url http://localhost --concurrency 64 --duration 30
+  python3 scripts/load-test-web.py --slow-clients 200
+"""
+import argparse
+import http.client
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+
+# (method, path, body) mix, weighted roughly like real scanner traffic
+ROUTES = [
+    ('GET', '/', None),
+    ('GET', '/', None),
+    ('POST', '/login', 'username=admin&password=admin123'),
+    ('GET', '/admin', None),
+    ('GET', '/api/v1/status', None),
+    ('GET', '/api/v1/users', None),
+    ('GET', '/phpmyadmin/', None),
+    ('GET', '/wp-login.php', None),
+    ('GET', '/wp-login.php', None),
+    ('GET', '/.env', None),
+    ('GET', '/.env', None),
+    ('GET', '/.git/config', None),
+    ('GET', '/cgi-bin/luci', None),
+]
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def client(target, deadline, results, errors):
+    conn = None
+    while time.monotonic() < deadline:
+        method, path, body = random.choice(ROUTES)
+        headers = {'User-Agent': 'honeypot-load-test'}
+        if body:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors[type(e).__name__] += 1
+            if conn is not None:
+                conn.close()
+            conn = None
+            continue
+        results[path].append(time.perf_counter() - start)
+    if conn is not None:
+        conn.close()
+
+
+def slow_client(target, deadline):
+    """Send a partial request and keep it alive one header at a time"""
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((target.hostname, target.port or 80), timeout=10) as sock:
+                sock.sendall(b'GET / HTTP/1.1\r\nHost: honeypot\r\n')
+                while time.monotonic() < deadline:
+                    time.sleep(5)
+                    sock.sendall(b'X-a: %d\r\n' % random.randint(1, 5000))
+        except OSError:
+            time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://localhost')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds')
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='slowloris-style connections held open meanwhile')
+    args = parser.parse_args()
+
+    target = urlparse(args.url)
+    deadline = time.monotonic() + args.duration
+    results = defaultdict(list)
+    errors = Counter()
+
+    threads = [threading.Thread(target=slow_client, args=(target, deadline), daemon=True)
+               for _ in range(args.slow_clients)]
+    threads += [threading.Thread(target=client, args=(target, deadline, results, errors))
+                for _ in range(args.concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads[args.slow_clients:]:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(latency for route in results.values() for latency in route)
+    if not latencies:
+        print(f"No successful requests ({dict(errors)})")
+        return 1
+
+    print(f"{len(latencies)} requests in {elapsed:.1f}s, {args.concurrency} clients, "
+          f"{args.slow_clients} slow clients")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.1f} ms  "
+          f"p99: {percentile(latencies, 99) * 1000:.1f} ms  "
+          f"p99.9: {percentile(latencies, 99.9) * 1000:.1f} ms  "
+          f"max: {latencies[-1] * 1000:.1f} ms")
+    if errors:
+        print(f"errors: {dict(errors)}")
+
+    print(f"\n{'route':<20} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for path, values in sorted(results.items()):
+        values.sort()
+        print(f"{path:<20} {len(values):>9} {statistics.median(values) * 1000:>8.1f} "
+              f"{percentile(values, 99) * 1000:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
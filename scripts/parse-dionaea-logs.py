@@ -1,131 +1,359 @@
 #!/usr/bin/env python3
 """
 Parse Dionaea logs and create JSON output for Grafana
+
+With --follow the parser keeps running and polls dionaea.log like
+`tail -F`: only complete lines appended since the last poll are parsed and
+their events appended to ftp_parsed.json. The byte offset, inode and a
+fingerprint of the last parsed bytes are checkpointed next to the output,
+so a restart resumes where it stopped and a rotated or truncated log is
+read again from the start. Without --follow new lines are parsed once.
+
+Without a checkpoint the whole log is parsed into a temporary file that
+then replaces ftp_parsed.json with an atomic rename, so the log server
+never reads a truncated or half-rebuilt file. After that, events are only
+ever appended in whole lines.
+
+While the log has no FTP events yet, the output holds a single no_activity
+placeholder so the dashboards have something to show. It is dropped, by
+atomically replacing the output with an empty file, just before the first
+real events are appended.
 """
+import argparse
 import json
-import re
+import os
+import signal
+import sys
+import time
 from datetime import datetime
 from pathlib import Path
 
+from dionaea_classifier import ENDPOINTS, VERB, read_line_start
+from segmented_log import SegmentedLog, read_manifest, replace_log
+
+LOG_FILE = '/opt/dionaea/var/log/dionaea/dionaea.log'
+OUTPUT_FILE = '/logs/dionaea/ftp_parsed.json'
+POLL_INTERVAL = float(os.environ.get('POLL_INTERVAL', '1.0'))
+READ_SIZE = 1024 * 1024
+FINGERPRINT_SIZE = 64
+
+# Define standard fields for all events
+def create_event(timestamp, event_type, **kwargs):
+    """Create a normalized event with all possible fields"""
+    event = {
+        'timestamp': timestamp,
+        'event_type': event_type,
+        'protocol': 'ftp',
+        'src_ip': kwargs.get('src_ip', None),
+        'src_port': kwargs.get('src_port', None),
+        'dst_port': kwargs.get('dst_port', None),
+        'username': kwargs.get('username', None),
+        'password': kwargs.get('password', None),
+        'command': kwargs.get('command', None),
+        'message': kwargs.get('message', None),
+        'count': kwargs.get('count', 1)
+    }
+    return event
+
+def no_activity_event():
+    """Placeholder that keeps the dashboards from erroring on an empty log"""
+    return create_event(
+        timestamp=datetime.now().isoformat(),
+        event_type='no_activity',
+        message='No FTP activity detected yet',
+        count=0
+    )
+
+def parse_line(line):
+    """Parse one dionaea.log line into an FTP event, or None
+
+    Only lines with an endpoint pair or a processed FTP command can give
+    an event, and only the fields those need are read, with the patterns
+    of common/dionaea_classifier.py (classify_line would extract every
+    field of every candidate line).
+    """
+    connection = '<->' in line
+    processing = 'processing line' in line
+    if not connection and not processing:
+        return None
+    lower = line.lower()
+    ftp = 'ftp' in lower
+    if not ftp and 'connection' not in lower:
+        return None
+    timestamp, component, start = read_line_start(line)
+    if timestamp is None:
+        return None
+
+    # Parse connection lines - format: connection ... 172.25.0.2 21 <-> 203.0.113.7 48522
+    if connection and ftp and component == 'connection':
+        match = ENDPOINTS.search(line, start)
+        if match:
+            return create_event(
+                timestamp=timestamp,
+                event_type='connection',
+                src_ip=match.group(3),
+                src_port=int(match.group(4)),
+                dst_port=int(match.group(2))
+            )
+
+    # Parse FTP commands - format: processing line 'b'USER testuser5''
+    if processing:
+        match = VERB.search(line, start)
+        if match is None:
+            return None
+        verb, argument, command = match.groups()
+        command = verb or command
+        if command not in ('USER', 'PASS', 'RETR', 'STOR'):
+            return None
+        username = None
+        password = None
+        if command == 'USER':
+            username = argument.strip()
+        elif command == 'PASS':
+            password = argument.strip()
+
+        return create_event(
+            timestamp=timestamp,
+            event_type='ftp_command',
+            command=command,
+            username=username,
+            password=password
+        )
+    return None
+
 def parse_dionaea_log(log_file):
-    """Parse dionaea.log and extract FTP events"""
+    """Parse all of dionaea.log and extract FTP events"""
     events = []
-    
+
     if not Path(log_file).exists():
         return events
-    
-    # Define standard fields for all events
-    def create_event(timestamp, event_type, **kwargs):
-        """Create a normalized event with all possible fields"""
-        event = {
-            'timestamp': timestamp,
-            'event_type': event_type,
-            'protocol': 'ftp',
-            'src_ip': kwargs.get('src_ip', None),
-            'src_port': kwargs.get('src_port', None),
-            'dst_port': kwargs.get('dst_port', None),
-            'username': kwargs.get('username', None),
-            'password': kwargs.get('password', None),
-            'command': kwargs.get('command', None),
-            'message': kwargs.get('message', None),
-            'count': kwargs.get('count', 1)
-        }
-        return event
-    
-    # Regex patterns for different log types
-    connection_pattern = r'\[(\d{2}\w{3}\d{4} \d{2}:\d{2}:\d{2})\] connection\s+(\S+)\s+(\S+)\s+(\d+)\s+<->\s+(\S+)\s+(\d+)'
-    
+
     try:
         with open(log_file, 'r', errors='ignore') as f:
             for line in f:
-                # Parse connection lines
-                conn_match = re.search(connection_pattern, line)
-                if conn_match and 'ftp' in line.lower():
-                    timestamp_str = conn_match.group(1)
-                    try:
-                        # Parse timestamp like "02Dec2025 12:45:30"
-                        dt = datetime.strptime(timestamp_str, '%d%b%Y %H:%M:%S')
-                        timestamp = dt.isoformat()
-                    except:
-                        timestamp = datetime.now().isoformat()
-                    
-                    event = create_event(
-                        timestamp=timestamp,
-                        event_type='connection',
-                        src_ip=conn_match.group(4),
-                        src_port=int(conn_match.group(5)),
-                        dst_port=int(conn_match.group(6))
-                    )
+                event = parse_line(line)
+                if event:
                     events.append(event)
-                
-                # Parse FTP commands - format: processing line 'b'USER testuser5''
-                elif 'processing line' in line and ("b'USER" in line or "b'PASS" in line or "b'RETR" in line or "b'STOR" in line):
-                    # Extract timestamp
-                    ts_match = re.search(r'\[(\d{2}\d{2}\d{4} \d{2}:\d{2}:\d{2})\]', line)
-                    if ts_match:
-                        try:
-                            dt = datetime.strptime(ts_match.group(1), '%m%d%Y %H:%M:%S')
-                            timestamp = dt.isoformat()
-                        except:
-                            timestamp = datetime.now().isoformat()
-                        
-                        # Extract command and parameters - format: processing line 'b'USER testuser5''
-                        username = None
-                        password = None
-                        command = None
-                        
-                        if "b'USER" in line:
-                            command = 'USER'
-                            # Extract username: processing line 'b'USER testuser5''
-                            user_match = re.search(r"b'USER\s+([^']+)'", line)
-                            if user_match:
-                                username = user_match.group(1).strip()
-                        elif "b'PASS" in line:
-                            command = 'PASS'
-                            # Extract password
-                            pass_match = re.search(r"b'PASS\s+([^']+)'", line)
-                            if pass_match:
-                                password = pass_match.group(1).strip()
-                        elif "b'RETR" in line:
-                            command = 'RETR'
-                        elif "b'STOR" in line:
-                            command = 'STOR'
-                        
-                        if command:
-                            event = create_event(
-                                timestamp=timestamp,
-                                event_type='ftp_command',
-                                command=command,
-                                username=username,
-                                password=password
-                            )
-                            events.append(event)
-    
     except Exception as e:
         print(f"Error parsing log: {e}")
-    
+
     # If no events found, create a dummy event to prevent dashboard errors
     if not events:
-        events.append(create_event(
-            timestamp=datetime.now().isoformat(),
-            event_type='no_activity',
-            message='No FTP activity detected yet',
-            count=0
-        ))
-    
+        events.append(no_activity_event())
+
     return events
 
+class Checkpoint:
+    """Position in dionaea.log up to which events have been written"""
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.fingerprint = b''
+        # The output holds only the no_activity placeholder
+        self.placeholder = False
+        self.exists = False
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+            self.inode = state['inode']
+            self.offset = state['offset']
+            self.fingerprint = bytes.fromhex(state['fingerprint'])
+            self.placeholder = state.get('placeholder', False)
+            self.exists = True
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'inode': self.inode, 'offset': self.offset,
+                       'fingerprint': self.fingerprint.hex(),
+                       'placeholder': self.placeholder}, f)
+        os.replace(tmp_path, self.path)
+        self.exists = True
+
+class DionaeaFollower:
+    """Incrementally parse dionaea.log, surviving restarts and rotation"""
+
+    def __init__(self, log_file, output, checkpoint, save_each_chunk=True):
+        self.log_file = log_file
+        self.output = output
+        self.checkpoint = checkpoint
+        self.save_each_chunk = save_each_chunk
+        self.file = None
+        self.partial = b''
+
+    def _open(self):
+        """Open the log, resuming at the checkpoint if it is still valid"""
+        try:
+            self.file = open(self.log_file, 'rb')
+        except FileNotFoundError:
+            return False
+        st = os.fstat(self.file.fileno())
+        cp = self.checkpoint
+        resume = (cp.inode == st.st_ino and cp.offset <= st.st_size)
+        if resume and cp.fingerprint:
+            self.file.seek(cp.offset - len(cp.fingerprint))
+            resume = self.file.read(len(cp.fingerprint)) == cp.fingerprint
+        if not resume:
+            cp.inode, cp.offset, cp.fingerprint = st.st_ino, 0, b''
+        self.file.seek(cp.offset)
+        self.partial = b''
+        return True
+
+    def _rotated(self):
+        """True once the path refers to a new file or the file shrank"""
+        try:
+            st = os.stat(self.log_file)
+        except FileNotFoundError:
+            return False
+        return (st.st_ino != self.checkpoint.inode
+                or st.st_size < self.checkpoint.offset + len(self.partial))
+
+    def _read_chunk(self):
+        """Return the complete lines of the next READ_SIZE bytes, None at EOF
+
+        A line cut by the end of the chunk is kept in self.partial and
+        completed by the next chunk, so memory stays at about one chunk
+        however far behind the parser is.
+        """
+        chunk = self.file.read(READ_SIZE)
+        if not chunk:
+            return None
+        data = self.partial + chunk
+        end = data.rfind(b'\n') + 1
+        complete, self.partial = data[:end], data[end:]
+        if complete:
+            self.checkpoint.offset += len(complete)
+            self.checkpoint.fingerprint = (
+                self.checkpoint.fingerprint + complete[-FINGERPRINT_SIZE:])[-FINGERPRINT_SIZE:]
+        # Only b'\n' ends a line: str.splitlines() would also split on the
+        # form feeds, separators and \u2028 an attacker can put in a command
+        lines = complete.split(b'\n')
+        lines.pop()
+        return [line.decode('utf-8', errors='ignore') for line in lines]
+
+    def _parse_new_lines(self):
+        """Write events for the lines appended since the last call
+
+        Events are written and the checkpoint saved after every chunk, so
+        an interrupted catch-up resumes from the last chunk written.
+        """
+        written = 0
+        while True:
+            lines = self._read_chunk()
+            if lines is None:
+                return written
+            if not lines:
+                continue
+            events = [event for event in map(parse_line, lines) if event]
+            if events:
+                if self.checkpoint.placeholder:
+                    self._drop_placeholder()
+                self.output.write(''.join(json.dumps(event) + '\n' for event in events))
+                self.output.flush()
+                written += len(events)
+            if self.save_each_chunk:
+                self.checkpoint.save()
+
+    def _drop_placeholder(self):
+        """Empty the output before its first real events
+
+        If the checkpoint is not saved after this, the next run drops
+        whatever was written since and parses those lines again.
+        """
+        empty_path = self.output.path + '.empty.tmp'
+        open(empty_path, 'w').close()
+        replace_log(self.output.path, empty_path)
+        self.checkpoint.placeholder = False
+
+    def poll(self):
+        """Append events for new lines and return how many were written"""
+        if self.file is None and not self._open():
+            return 0
+        written = self._parse_new_lines()
+        if self._rotated():
+            print(f"[*] {self.log_file} was rotated or truncated, reading from the start")
+            # Pick up anything written to the old file since the read above,
+            # then continue with the new file from its start
+            written += self._parse_new_lines()
+            self.file.close()
+            self.file = None
+            self.checkpoint.inode = None
+            if self._open():
+                written += self._parse_new_lines()
+        return written
+
+def rebuild_output(log_file, output_path):
+    """Parse the whole log into a new output and publish it atomically
+
+    The log is parsed and the temporary output written one READ_SIZE chunk
+    at a time, so a rebuild needs no more memory than following does. An
+    interrupted rebuild starts over, so the checkpoint is saved once at the
+    end and only moved into place once the output it describes has been
+    published.
+    """
+    tmp_output = output_path + '.rebuild.tmp'
+    tmp_checkpoint = output_path + '.checkpoint.rebuild.tmp'
+    for path in (tmp_output, tmp_checkpoint):
+        if os.path.exists(path):
+            os.remove(path)
+
+    checkpoint = Checkpoint(tmp_checkpoint)
+    with open(tmp_output, 'w') as output:
+        follower = DionaeaFollower(log_file, output, checkpoint, save_each_chunk=False)
+        written = follower.poll()
+        if follower.file is not None:
+            follower.file.close()
+        if not written:
+            output.write(json.dumps(no_activity_event()) + '\n')
+            checkpoint.placeholder = True
+        output.flush()
+        os.fsync(output.fileno())
+    checkpoint.save()
+
+    replace_log(output_path, tmp_output)
+    os.replace(tmp_checkpoint, output_path + '.checkpoint')
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--follow', action='store_true',
+                        help='keep running and parse lines as they are appended')
+    parser.add_argument('--log-file', default=LOG_FILE)
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    args = parser.parse_args()
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if not Checkpoint(args.output + '.checkpoint').exists:
+        # No record of what the output holds; rebuild it from the start of the log
+        written = rebuild_output(args.log_file, args.output)
+        print(f"Rebuilt {args.output} with {written} FTP events")
+    checkpoint = Checkpoint(args.output + '.checkpoint')
+
+    # Write as NDJSON (newline-delimited JSON), rotated like the other logs
+    output = SegmentedLog(args.output)
+    follower = DionaeaFollower(args.log_file, output, checkpoint)
+    try:
+        written = follower.poll()
+        if (not written and not os.path.getsize(args.output)
+                and not read_manifest(args.output)['segments']):
+            output.write(json.dumps(no_activity_event()) + '\n')
+            output.flush()
+            checkpoint.placeholder = True
+            checkpoint.save()
+        print(f"Parsed {written} FTP events")
+
+        while args.follow:
+            time.sleep(POLL_INTERVAL)
+            written = follower.poll()
+            if written:
+                print(f"Parsed {written} FTP events")
+    finally:
+        output.close()
+
 if __name__ == '__main__':
-    log_file = '/opt/dionaea/var/log/dionaea/dionaea.log'
-    output_file = '/logs/dionaea/ftp_parsed.json'
-    
-    # Parse logs
-    events = parse_dionaea_log(log_file)
-    
-    # Write as NDJSON (newline-delimited JSON)
-    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
-    with open(output_file, 'w') as f:
-        for event in events:
-            f.write(json.dumps(event) + '\n')
-    
-    print(f"Parsed {len(events)} FTP events")
+    main()
@@ -4,38 +4,136 @@ Simple SSH Honeypot using Paramiko
 Logs all authentication attempts and commands
 """
 
+import re
+import signal
 import socket
 import sys
 import threading
+import queue
+import time
 import paramiko
+import atexit
 import json
 import logging
+import logging.handlers
+from collections import Counter
 from datetime import datetime
 import os
 
+from segmented_log import SegmentedLog
+
 # Configure logging
 LOG_DIR = '/app/logs'
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# JSON logger
-json_handler = logging.FileHandler(f'{LOG_DIR}/ssh_honeypot.json')
-json_handler.setLevel(logging.INFO)
+# Events are queued by session threads and written in batches by a single
+# writer thread, so bursts never contend on a file lock.
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '1.0'))
+LOG_BATCH_SIZE = 1000
+# buffered: flush every LOG_FLUSH_INTERVAL, flush: after every batch,
+# fsync: flush and fsync after every batch
+LOG_DURABILITY = os.environ.get('LOG_DURABILITY', 'flush')
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts records dropped when the queue is full"""
 
-# Console logger
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchLogWriter:
+    """Drains queued records and writes them to the JSON log in batches"""
+
+    def __init__(self, log_queue, path, durability=LOG_DURABILITY,
+                 flush_interval=LOG_FLUSH_INTERVAL):
+        self.queue = log_queue
+        # Rotated into compressed segments (see segmented_log.py)
+        self.file = SegmentedLog(path)
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self._stopping = False
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self.thread.join(timeout=5)
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        text = ''.join(record.getMessage() + '\n' for record in batch)
+        self.file.write(text)
+        sys.stdout.write(text)
+        self.written += len(batch)
+        if self.durability != 'buffered':
+            self.file.flush()
+            if self.durability == 'fsync':
+                os.fsync(self.file.fileno())
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not (self._stopping and self.queue.empty()):
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = None
+            if record is not None:
+                self._write(self._drain(record))
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.file.flush()
+                sys.stdout.flush()
+                last_flush = time.monotonic()
+        self.file.close()
+
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = DroppingQueueHandler(log_queue)
+queue_handler.setLevel(logging.INFO)
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(message)s',
-    handlers=[json_handler, console_handler]
+    handlers=[queue_handler]
 )
 
 logger = logging.getLogger(__name__)
 
+log_writer = BatchLogWriter(log_queue, f'{LOG_DIR}/ssh_honeypot.json')
+
 HOST_KEY = paramiko.RSAKey(filename='/app/ssh_host_rsa_key')
 SSH_PORT = 222
 
+# Connection engine limits
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', '200'))
+ACCEPT_QUEUE = int(os.environ.get('ACCEPT_QUEUE', '500'))
+MAX_PER_IP = int(os.environ.get('MAX_PER_IP', '10'))
+LISTEN_BACKLOG = int(os.environ.get('LISTEN_BACKLOG', '1024'))
+AUTH_TIMEOUT = float(os.environ.get('AUTH_TIMEOUT', '20'))
+SHELL_TIMEOUT = float(os.environ.get('SHELL_TIMEOUT', '10'))
+METRICS_INTERVAL = float(os.environ.get('METRICS_INTERVAL', '60'))
+
+# Fake shell input handling
+RECV_SIZE = 4096
+MAX_LINE_LENGTH = int(os.environ.get('MAX_LINE_LENGTH', '8192'))
+LINE_BREAK = re.compile(rb'\r\n|\r|\n')
+
 class SSHServerHandler(paramiko.ServerInterface):
     def __init__(self, client_ip):
         self.client_ip = client_ip
@@ -82,6 +180,39 @@ class SSHServerHandler(paramiko.ServerInterface):
     def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
         return True
 
+def read_lines(channel):
+    """Yield (line, truncated) for each CR/LF-terminated line from a channel
+
+    Whatever bytes are available are read at once into a bytearray, so a
+    pasted payload costs one recv per RECV_SIZE bytes rather than per byte.
+    Lines longer than MAX_LINE_LENGTH are cut there and the rest of the
+    line is discarded.
+    """
+    buf = bytearray()
+    discarding = False
+    while True:
+        data = channel.recv(RECV_SIZE)
+        if not data:
+            return
+        buf += data
+        start = 0
+        for match in LINE_BREAK.finditer(buf):
+            if discarding:
+                discarding = False
+            elif match.start() - start > MAX_LINE_LENGTH:
+                # Arrived whole in one recv, so never reached the check below
+                yield bytes(buf[start:start + MAX_LINE_LENGTH]), True
+            else:
+                yield bytes(buf[start:match.start()]), False
+            start = match.end()
+        del buf[:start]
+
+        if len(buf) > MAX_LINE_LENGTH:
+            if not discarding:
+                yield bytes(buf[:MAX_LINE_LENGTH]), True
+                discarding = True
+            buf.clear()
+
 def handle_connection(client, addr):
     client_ip = addr[0]
     log_entry = {
@@ -100,53 +231,46 @@ def handle_connection(client, addr):
         server = SSHServerHandler(client_ip)
         transport.start_server(server=server)
 
-        channel = transport.accept(20)
+        channel = transport.accept(AUTH_TIMEOUT)
         if channel is None:
             return
 
-        server.event.wait(10)
+        server.event.wait(SHELL_TIMEOUT)
         if not server.event.is_set():
             return
 
         channel.send(b'Welcome to Ubuntu 20.04.3 LTS (GNU/Linux 5.4.0-42-generic x86_64)\r\n\r\n$ ')
 
         # Simple command loop
-        command = b''
-        while True:
-            char = channel.recv(1)
-            if not char:
-                break
-
-            if char == b'\r' or char == b'\n':
-                cmd = command.decode('utf-8', errors='ignore').strip()
-                if cmd:
-                    log_entry = {
-                        'timestamp': datetime.utcnow().isoformat(),
-                        'event_type': 'command',
-                        'src_ip': client_ip,
-                        'command': cmd
-                    }
-                    logger.info(json.dumps(log_entry))
-
-                    # Fake command responses
-                    if cmd == 'ls':
-                        channel.send(b'\r\nDesktop  Documents  Downloads  Pictures\r\n')
-                    elif cmd.startswith('cat'):
-                        channel.send(b'\r\nPermission denied\r\n')
-                    elif cmd == 'whoami':
-                        channel.send(b'\r\nroot\r\n')
-                    elif cmd == 'pwd':
-                        channel.send(b'\r\n/root\r\n')
-                    elif cmd == 'exit':
-                        channel.send(b'\r\nlogout\r\n')
-                        break
-                    else:
-                        channel.send(b'\r\ncommand not found\r\n')
-
-                channel.send(b'$ ')
-                command = b''
-            else:
-                command += char
+        for line, truncated in read_lines(channel):
+            cmd = line.decode('utf-8', errors='ignore').strip()
+            if cmd:
+                log_entry = {
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'event_type': 'command',
+                    'src_ip': client_ip,
+                    'command': cmd
+                }
+                if truncated:
+                    log_entry['truncated'] = True
+                logger.info(json.dumps(log_entry))
+
+                # Fake command responses
+                if cmd == 'ls':
+                    channel.send(b'\r\nDesktop  Documents  Downloads  Pictures\r\n')
+                elif cmd.startswith('cat'):
+                    channel.send(b'\r\nPermission denied\r\n')
+                elif cmd == 'whoami':
+                    channel.send(b'\r\nroot\r\n')
+                elif cmd == 'pwd':
+                    channel.send(b'\r\n/root\r\n')
+                elif cmd == 'exit':
+                    channel.send(b'\r\nlogout\r\n')
+                    break
+                else:
+                    channel.send(b'\r\ncommand not found\r\n')
+
+            channel.send(b'$ ')
 
     except Exception as e:
         log_entry = {
@@ -163,24 +287,127 @@ def handle_connection(client, addr):
             pass
         client.close()
 
+class ConnectionEngine:
+    """Bounded pool of session workers fed by an accept queue
+
+    A fixed number of worker threads handle sessions, so a brute-force wave
+    cannot spawn unbounded threads. Connections beyond the queue capacity or
+    the per-IP cap are closed immediately instead of piling up.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, queue_size=ACCEPT_QUEUE,
+                 max_per_ip=MAX_PER_IP):
+        self.max_sessions = max_sessions
+        self.max_per_ip = max_per_ip
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.per_ip = Counter()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.stats = Counter()
+
+    def start(self):
+        for _ in range(self.max_sessions):
+            threading.Thread(target=self._worker, daemon=True).start()
+        threading.Thread(target=self._report_metrics, daemon=True).start()
+
+    def submit(self, client, addr):
+        client_ip = addr[0]
+        with self.lock:
+            if self.per_ip[client_ip] >= self.max_per_ip:
+                self.stats['rejected_per_ip'] += 1
+                reason = 'per_ip_limit'
+            else:
+                self.per_ip[client_ip] += 1
+                reason = None
+        if reason is None:
+            try:
+                self.pending.put_nowait((client, addr))
+                self.stats['accepted'] += 1
+                return
+            except queue.Full:
+                self._release(client_ip)
+                self.stats['rejected_queue_full'] += 1
+                reason = 'queue_full'
+        self._reject(client, addr, reason)
+
+    def _reject(self, client, addr, reason):
+        log_entry = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'event_type': 'connection_rejected',
+            'src_ip': addr[0],
+            'src_port': addr[1],
+            'reason': reason
+        }
+        logger.info(json.dumps(log_entry))
+        try:
+            client.close()
+        except OSError:
+            pass
+
+    def _release(self, client_ip):
+        with self.lock:
+            self.per_ip[client_ip] -= 1
+            if self.per_ip[client_ip] <= 0:
+                del self.per_ip[client_ip]
+
+    def _worker(self):
+        while True:
+            client, addr = self.pending.get()
+            with self.lock:
+                self.active += 1
+            try:
+                handle_connection(client, addr)
+            except Exception as e:
+                print(f'[!] Session error from {addr[0]}: {e}')
+            finally:
+                with self.lock:
+                    self.active -= 1
+                self._release(addr[0])
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'active_sessions': self.active,
+                'queue_depth': self.pending.qsize(),
+                'tracked_ips': len(self.per_ip),
+                'accepted': self.stats['accepted'],
+                'rejected_queue_full': self.stats['rejected_queue_full'],
+                'rejected_per_ip': self.stats['rejected_per_ip'],
+                'log_queue_depth': log_queue.qsize(),
+                'log_written': log_writer.written,
+                'log_dropped': queue_handler.dropped,
+            }
+
+    def _report_metrics(self):
+        while True:
+            time.sleep(METRICS_INTERVAL)
+            print(f'[*] Metrics: {json.dumps(self.metrics())}')
+
+
 def main():
     print(f'[*] SSH Honeypot starting on port {SSH_PORT}...')
 
+    # Flush queued events on docker stop
+    log_writer.start()
+    atexit.register(log_writer.stop)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     try:
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server_socket.bind(('0.0.0.0', SSH_PORT))
-        server_socket.listen(100)
+        server_socket.listen(LISTEN_BACKLOG)
 
-        print(f'[*] Listening for connections on 0.0.0.0:{SSH_PORT}...')
+        engine = ConnectionEngine()
+        engine.start()
+
+        print(f'[*] Listening for connections on 0.0.0.0:{SSH_PORT} '
+              f'({MAX_SESSIONS} sessions, queue {ACCEPT_QUEUE}, {MAX_PER_IP} per IP)...')
 
         while True:
             client, addr = server_socket.accept()
             print(f'[*] Connection from {addr[0]}:{addr[1]}')
-
-            thread = threading.Thread(target=handle_connection, args=(client, addr))
-            thread.daemon = True
-            thread.start()
+            engine.submit(client, addr)
 
     except Exception as e:
         print(f'[!] Error: {e}')
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+The SQLite event store must answer /<log> record queries exactly like the
+file backend (log-server/convert_logs.py)
+
+Run from the repository root:
+  python3 -m pytest tests
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'log-server')]
+# Index and database state must not touch a real deployment
+STATE_DIR = tempfile.mkdtemp(prefix='honeypot-state-')
+os.environ.setdefault('STATE_DIR', STATE_DIR)
+
+import convert_logs  # noqa: E402
+from event_store import EventStore  # noqa: E402
+from log_index import get_index  # noqa: E402
+from segments import get_segments  # noqa: E402
+
+LOGS = {
+    'ssh-honeypot/ssh_honeypot.json': [
+        {'timestamp': '2025-01-01T00:00:01', 'event_type': 'connection', 'src_ip': '6.6.6.6'},
+        {'timestamp': '2025-01-01T00:00:02', 'event_type': 'login_attempt',
+         'src_ip': '6.6.6.6', 'username': 'root', 'password': 'toor'},
+        {'timestamp': '2025-01-01T00:00:03', 'src_ip': '7.7.7.7'},
+    ],
+    'web-honeypot/honeypot.json': [
+        {'timestamp': '2025-01-01T00:10:00', 'remote_addr': '6.6.6.6', 'method': 'GET',
+         'path': '/.env', 'form_data': {}},
+        {'timestamp': '2025-01-01T00:10:05', 'remote_addr': '6.6.6.6', 'method': 'POST',
+         'path': '/login', 'form_data': {'username': 'admin', 'password': 'admin'}},
+    ],
+    'dionaea/ftp_parsed.json': [
+        {'timestamp': '2025-01-01T00:05:00', 'event_type': 'connection', 'protocol': 'ftp',
+         'src_ip': '6.6.6.6', 'src_port': 40000, 'dst_port': 21},
+        {'timestamp': '2025-01-01T00:05:01', 'event_type': 'ftp_command', 'protocol': 'ftp',
+         'src_ip': '6.6.6.6', 'username': 'anonymous', 'command': 'USER'},
+        {'timestamp': '2025-01-01T00:05:02', 'event_type': 'ftp_command', 'protocol': 'ftp',
+         'src_ip': '6.6.6.6', 'command': 'RETR'},
+    ],
+}
+
+QUERIES = [
+    'event_type=connection',
+    'event_type=login_attempt',
+    # Normalized as http_request / login_attempt for /events only
+    'event_type=http_request',
+    # USER is normalized to ftp_login_attempt for /events only
+    'event_type=ftp_command',
+    'event_type=ftp_login_attempt',
+    'event_type=unknown',
+    'event_type=connection,ftp_command&src_ip=6.6.6.6',
+    'src_ip=6.6.6.6&from=2025-01-01T00:05:01',
+]
+
+
+class BackendParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.log_dir = tempfile.mkdtemp(prefix='honeypot-logs-')
+        for name, records in LOGS.items():
+            os.makedirs(os.path.join(cls.log_dir, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(cls.log_dir, name), 'w') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in records))
+        cls.store = EventStore(os.path.join(cls.log_dir, 'events.db'))
+        cls.store.ingest(cls.log_dir, list(LOGS))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.log_dir, ignore_errors=True)
+        shutil.rmtree(STATE_DIR, ignore_errors=True)
+
+    def file_records(self, name, query):
+        file_path = os.path.join(self.log_dir, name)
+        index = get_index(file_path, name)
+        segments = get_segments(file_path, name)
+        snapshot, manifest = segments.view(index)
+        return list(convert_logs.iter_records(index, snapshot, segments, manifest, query))
+
+    def test_same_rows_from_both_backends(self):
+        for name in LOGS:
+            for query_string in QUERIES:
+                with self.subTest(log=name, query=query_string):
+                    query = convert_logs.parse_query(query_string)
+                    self.assertEqual(list(self.store.iter_records(name, query)),
+                                     self.file_records(name, query))
+
+
+if __name__ == '__main__':
+    unittest.main()
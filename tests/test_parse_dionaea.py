@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the log server's Dionaea parser (log-server/parse_dionaea.py)
+
+Run from the repository root:
+  python3 -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'log-server')]
+
+import parse_dionaea  # noqa: E402
+
+
+def write_log(lines):
+    fd, path = tempfile.mkstemp(suffix='.log')
+    with os.fdopen(fd, 'w') as f:
+        f.write(''.join(line + '\n' for line in lines))
+    return path
+
+
+def parse(path, workers):
+    return list(parse_dionaea.parse_dionaea_logs(path, workers, parse_dionaea.ConnectionState()))
+
+
+class ParallelParseTest(unittest.TestCase):
+
+    def test_matches_single_process_when_time_goes_backwards(self):
+        lines = []
+        for i in range(400):
+            # The clock steps back an hour every 50 connections
+            hour = 11 - (i // 50) % 2
+            con = f'0x{i:06x}'
+            stamp = f'[02122025 {hour:02d}:53:{i % 60:02d}]'
+            lines += [
+                f'{stamp} connection connection.c:4456-message: connection {con} '
+                f'accept/tcp/ftp 172.25.0.2 21 <-> 203.0.113.{i % 250} {40000 + i}',
+                f"{stamp} ftp /dionaea/ftp.py:214-debug: con {con} processing line "
+                f"'b'USER user{i}\\r\\n''",
+                f"{stamp} ftp /dionaea/ftp.py:214-debug: con {con} processing line "
+                f"'b'PASS pass{i}\\r\\n''",
+            ]
+        path = write_log(lines)
+        self.addCleanup(os.remove, path)
+        chunk_bytes = parse_dionaea.CHUNK_BYTES
+        parse_dionaea.CHUNK_BYTES = 4096
+        self.addCleanup(setattr, parse_dionaea, 'CHUNK_BYTES', chunk_bytes)
+
+        single = parse(path, 1)
+        self.assertEqual(len(single), len(lines))
+        self.assertEqual(parse(path, 3), single)
+
+
+class MalformedTimestampTest(unittest.TestCase):
+
+    def test_impossible_date_does_not_stop_the_parse(self):
+        # Month 14: read as MMDDYYYY this is not a date
+        path = write_log([
+            '[14092025 11:53:15] connection connection.c:4456-message: connection 0x1 '
+            'accept/tcp/ftp 172.25.0.2 21 <-> 203.0.113.7 48522',
+            "[14092025 11:53:15] ftp /dionaea/ftp.py:214-debug: con 0x1 processing line "
+            "'b'USER anonymous''",
+        ])
+        self.addCleanup(os.remove, path)
+        entries = parse(path, 1)
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[1]['username'], 'anonymous')
+        for entry in entries:
+            # Replaced by a readable time rather than passed on
+            parse_dionaea.log_seconds(entry['timestamp'])
+
+    def test_unreadable_timestamp_skips_expiry(self):
+        state = parse_dionaea.ConnectionState(ttl=60)
+        state.credentials('0x1', '2025-09-14T11:00:00Z')['username'] = 'root'
+        credentials = state.credentials('0x2', '2025-14-09T11:53:15Z')
+        self.assertEqual(credentials, {})
+        self.assertEqual(state.credentials('0x1', '2025-09-14T11:00:30Z'),
+                         {'username': 'root'})
+
+
+if __name__ == '__main__':
+    unittest.main()
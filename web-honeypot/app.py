@@ -4,32 +4,137 @@ Simple Web Honeypot
 Logs all HTTP requests and simulates vulnerable endpoints
 """
 
-from flask import Flask, request, render_template_string, jsonify
+from flask import Flask, request, jsonify
+import atexit
+import gzip
 import json
 import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
 from datetime import datetime
 import os
 
+from segmented_log import SegmentedLog, call_blocking
+
 app = Flask(__name__)
 
 # Configure logging
 LOG_DIR = '/app/logs'
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# JSON logger for structured logging
-json_handler = logging.FileHandler(f'{LOG_DIR}/honeypot.json')
-json_handler.setLevel(logging.INFO)
+# Request records are queued and written by a background thread so that
+# response latency never depends on the disk.
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '1.0'))
+# drop_oldest: discard the oldest queued record when full
+# sample: reservoir-sample a burst, so the queue holds a uniform sample of
+#         everything received since it was last written
+LOG_OVERFLOW = os.environ.get('LOG_OVERFLOW', 'drop_oldest')
+METRICS_INTERVAL = float(os.environ.get('METRICS_INTERVAL', '60'))
+
+def echo(text):
+    """Mirror written records to stdout for docker logs"""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+class RequestLogQueue:
+    """Bounded in-process queue with a background batch writer"""
+
+    def __init__(self, path, max_size=LOG_QUEUE_SIZE, overflow=LOG_OVERFLOW):
+        self.path = path
+        self.max_size = max_size
+        self.overflow = overflow
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.stats = Counter()
+        # Records offered since the queue was last emptied (sample mode)
+        self.seen = 0
+        self.pid = None
+        self.thread = None
+        self.running = False
+
+    def _ensure_started(self):
+        # gunicorn forks workers after import; each needs its own thread
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.pending.clear()
+            self.seen = 0
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Write whatever is still queued before the worker exits"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout=5)
+
+    def put(self, log_entry):
+        with self.cond:
+            self._ensure_started()
+            self.stats['enqueued'] += 1
+            self.seen += 1
+            if len(self.pending) >= self.max_size:
+                self.stats['dropped'] += 1
+                if self.overflow == 'sample':
+                    # Keep the new record with probability max_size / seen
+                    slot = random.randrange(self.seen)
+                    if slot < len(self.pending):
+                        self.pending[slot] = log_entry
+                    return
+                self.pending.popleft()
+            self.pending.append(log_entry)
+            if len(self.pending) == 1:
+                self.cond.notify()
+
+    def _take(self):
+        with self.cond:
+            if self.running and not self.pending:
+                self.cond.wait(LOG_FLUSH_INTERVAL)
+            batch, self.pending = self.pending, deque()
+            self.seen = 0
+            return batch
+
+    def _run(self):
+        last_report = time.monotonic()
+        # Every gunicorn worker appends to the same log. SegmentedLog writes
+        # each batch with one O_APPEND write, so lines never interleave, and
+        # rotates it into compressed segments.
+        log = SegmentedLog(self.path)
+        try:
+            while self.running or self.pending:
+                batch = self._take()
+                if batch:
+                    text = ''.join(json.dumps(entry) + '\n' for entry in batch)
+                    log.write(text)
+                    log.flush()
+                    # A full stdout pipe must only block this thread, not the
+                    # whole gevent worker
+                    call_blocking(echo, text)
+                    self.stats['written'] += len(batch)
+                if time.monotonic() - last_report >= METRICS_INTERVAL:
+                    last_report = time.monotonic()
+                    print(f"[*] Log queue ({self.pid}): depth={len(self.pending)} "
+                          f"written={self.stats['written']} dropped={self.stats['dropped']}")
+        finally:
+            log.close()
+
+request_log = RequestLogQueue(f'{LOG_DIR}/honeypot.json')
 
 # Console logger
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 
-app.logger.addHandler(json_handler)
 app.logger.addHandler(console_handler)
 app.logger.setLevel(logging.INFO)
 
 def log_request():
-    """Log incoming request details"""
+    """Capture incoming request details and queue them for writing"""
     log_entry = {
         'timestamp': datetime.utcnow().isoformat(),
         'remote_addr': request.remote_addr,
@@ -43,7 +148,7 @@ def log_request():
         'json_data': request.get_json(silent=True),
         'cookies': dict(request.cookies)
     }
-    app.logger.info(json.dumps(log_entry))
+    request_log.put(log_entry)
     return log_entry
 
 # Home page - Fake login portal
@@ -79,10 +184,49 @@ HOME_TEMPLATE = '''
 </html>
 '''
 
+class StaticResponse:
+    """Response body encoded once at startup, with a precompressed variant"""
+
+    def __init__(self, body, status=200, content_type='text/html; charset=utf-8'):
+        if isinstance(body, str):
+            body = body.encode()
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.status = status
+        self.content_type = content_type
+
+    def response(self):
+        headers = [('Content-Type', self.content_type), ('Vary', 'Accept-Encoding')]
+        body = self.body
+        if len(self.gzipped) < len(body) and request.accept_encodings['gzip']:
+            body = self.gzipped
+            headers.append(('Content-Encoding', 'gzip'))
+        return app.response_class(body, status=self.status, headers=headers)
+
+def json_response(obj, status=200):
+    return StaticResponse(jsonify(obj).get_data(), status, 'application/json')
+
+# Templates are compiled and rendered once; the routes below only pick a body
+with app.app_context():
+    home_template = app.jinja_env.from_string(HOME_TEMPLATE)
+    STATIC = {
+        'home': StaticResponse(home_template.render()),
+        'login_failed': StaticResponse(home_template.render(
+            error="Invalid credentials. Please try again.")),
+        'admin': json_response({"error": "Unauthorized", "code": 401}, 401),
+        'api_users': json_response({"error": "Authentication required"}, 401),
+        'phpmyadmin': StaticResponse("<h1>phpMyAdmin</h1><p>Error: Access denied</p>", 403),
+        'wordpress': StaticResponse("<h1>WordPress</h1><p>Page not found</p>", 404),
+        'env_file': StaticResponse("APP_KEY=base64:fake_key_here\nDB_PASSWORD=fake_password"),
+        'git_config': StaticResponse("[core]\n\trepositoryformatversion = 0"),
+        'not_found': json_response({"error": "Not Found"}, 404),
+        'internal_error': json_response({"error": "Internal Server Error"}, 500),
+    }
+
 @app.route('/')
 def home():
     log_request()
-    return render_template_string(HOME_TEMPLATE)
+    return STATIC['home'].response()
 
 @app.route('/login', methods=['POST'])
 def login():
@@ -93,13 +237,13 @@ def login():
     # Always fail but log credentials
     app.logger.warning(f"LOGIN_ATTEMPT: username={username}, password={'*' * len(password)}")
     
-    return render_template_string(HOME_TEMPLATE, error="Invalid credentials. Please try again.")
+    return STATIC['login_failed'].response()
 
 @app.route('/admin')
 @app.route('/admin/')
 def admin():
     log_request()
-    return jsonify({"error": "Unauthorized", "code": 401}), 401
+    return STATIC['admin'].response()
 
 @app.route('/api/v1/status')
 def api_status():
@@ -113,30 +257,30 @@ def api_status():
 @app.route('/api/v1/users')
 def api_users():
     log_request()
-    return jsonify({"error": "Authentication required"}), 401
+    return STATIC['api_users'].response()
 
 # Common vulnerable endpoints
 @app.route('/phpMyAdmin/')
 @app.route('/phpmyadmin/')
 def phpmyadmin():
     log_request()
-    return "<h1>phpMyAdmin</h1><p>Error: Access denied</p>", 403
+    return STATIC['phpmyadmin'].response()
 
 @app.route('/wp-admin/')
 @app.route('/wp-login.php')
 def wordpress():
     log_request()
-    return "<h1>WordPress</h1><p>Page not found</p>", 404
+    return STATIC['wordpress'].response()
 
 @app.route('/.env')
 def env_file():
     log_request()
-    return "APP_KEY=base64:fake_key_here\nDB_PASSWORD=fake_password", 200
+    return STATIC['env_file'].response()
 
 @app.route('/.git/config')
 def git_config():
     log_request()
-    return "[core]\n\trepositoryformatversion = 0", 200
+    return STATIC['git_config'].response()
 
 # Catch-all route
 @app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
@@ -147,12 +291,12 @@ def catch_all(path):
 @app.errorhandler(404)
 def not_found(e):
     log_request()
-    return jsonify({"error": "Not Found"}), 404
+    return STATIC['not_found'].response()
 
 @app.errorhandler(500)
 def internal_error(e):
     log_request()
-    return jsonify({"error": "Internal Server Error"}), 500
+    return STATIC['internal_error'].response()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=80)
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for the web honeypot
+
+Scanners often hold connections open (slowloris-style), so the default is
+the gevent worker: each worker multiplexes many clients instead of being
+blocked by a single slow one. Every setting can be overridden through the
+environment.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:80')
+
+worker_class = os.environ.get('WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Concurrent clients per gevent worker
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', '1000'))
+backlog = int(os.environ.get('BACKLOG', '2048'))
+
+# Drop idle keep-alive clients quickly; kill workers stuck for longer than
+# timeout and give in-flight requests a moment on restart
+keepalive = int(os.environ.get('KEEPALIVE', '5'))
+timeout = int(os.environ.get('TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '10'))
+
+# Bound the headers a client may send before it is disconnected
+limit_request_line = 4094
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+# Recycle workers now and then so a leak cannot grow without limit
+max_requests = int(os.environ.get('MAX_REQUESTS', '100000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('ACCESS_LOG', '/app/logs/access.log')
+errorlog = '/app/logs/error.log'
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'